@@ -1,11 +1,23 @@
 """Configuration dataclasses for the CDC Lambda export."""
 
 import os
+import re
 from dataclasses import dataclass, field
-from typing import Optional
+from functools import lru_cache
+from typing import Any, Optional
 
 from .exceptions import ConfigurationError
 
+# Unquoted PostgreSQL identifier; anything else is rejected before it can
+# be interpolated into extraction SQL.
+_IDENTIFIER_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_$]*$")
+
+
+def _validate_identifier(value: str, field_name: str) -> None:
+    """Raise ConfigurationError if value is not a plain SQL identifier."""
+    if not _IDENTIFIER_RE.match(value):
+        raise ConfigurationError(f"Invalid SQL identifier for {field_name}: {value!r}")
+
 
 @dataclass
 class AuroraConfig:
@@ -43,6 +55,16 @@ class TableConfig:
     batch_size: int = 10000
     s3_prefix: str = "cdc"
 
+    def __post_init__(self) -> None:
+        """Validate identifiers that are interpolated into extraction SQL."""
+        _validate_identifier(self.source_schema, "source_schema")
+        _validate_identifier(self.source_table, "source_table")
+        _validate_identifier(self.watermark_column, "watermark_column")
+        if self.created_at_column:
+            _validate_identifier(self.created_at_column, "created_at_column")
+        for column in self.source_columns:
+            _validate_identifier(column, "source_columns")
+
     @property
     def full_table_name(self) -> str:
         """Return fully qualified table name."""
@@ -56,6 +78,8 @@ class S3Config:
     bucket: str
     prefix: str = "cdc"
     kms_key_id: Optional[str] = None
+    compression: str = "zstd"
+    compression_level: Optional[int] = 1
 
 
 @dataclass
@@ -73,58 +97,103 @@ class LambdaConfig:
     def from_env(cls) -> "LambdaConfig":
         """Create config from environment variables.
 
-        This requires the Aurora secret to be fetched separately.
+        This requires the Aurora secret to be fetched separately. The
+        environment is parsed once per container (see ``_read_env``); each
+        call still returns fresh dataclasses because callers mutate them.
         """
-        required_vars = [
-            "AURORA_HOST",
-            "AURORA_PORT",
-            "AURORA_DATABASE",
-            "SOURCE_SCHEMA",
-            "SOURCE_TABLE",
-            "SOURCE_COLUMNS",
-            "WATERMARK_COLUMN",
-            "S3_BUCKET",
-            "S3_PREFIX",
-            "DYNAMODB_TABLE",
-        ]
-
-        missing = [v for v in required_vars if not os.environ.get(v)]
-        if missing:
-            raise ConfigurationError(f"Missing required environment variables: {missing}")
+        env = _read_env()
 
         # Aurora config will be populated later with secrets
         aurora = AuroraConfig(
-            host=os.environ["AURORA_HOST"],
-            port=int(os.environ["AURORA_PORT"]),
-            database=os.environ["AURORA_DATABASE"],
+            host=env["aurora_host"],
+            port=env["aurora_port"],
+            database=env["aurora_database"],
             username="",  # Populated from Secrets Manager
             password="",  # Populated from Secrets Manager
         )
 
-        columns = [c.strip() for c in os.environ["SOURCE_COLUMNS"].split(",")]
-
         table = TableConfig(
-            table_name=os.environ.get("TABLE_NAME", os.environ["SOURCE_TABLE"].upper() + "_CDC"),
-            source_schema=os.environ["SOURCE_SCHEMA"],
-            source_table=os.environ["SOURCE_TABLE"],
-            source_columns=columns,
-            watermark_column=os.environ["WATERMARK_COLUMN"],
-            created_at_column=os.environ.get("CREATED_AT_COLUMN"),
-            batch_size=int(os.environ.get("BATCH_SIZE", "10000")),
-            s3_prefix=os.environ["S3_PREFIX"],
+            table_name=env["table_name"],
+            source_schema=env["source_schema"],
+            source_table=env["source_table"],
+            source_columns=list(env["source_columns"]),
+            watermark_column=env["watermark_column"],
+            created_at_column=env["created_at_column"],
+            batch_size=env["batch_size"],
+            s3_prefix=env["s3_prefix"],
         )
 
         s3 = S3Config(
-            bucket=os.environ["S3_BUCKET"],
-            prefix=os.environ["S3_PREFIX"],
-            kms_key_id=os.environ.get("KMS_KEY_ID"),
+            bucket=env["s3_bucket"],
+            prefix=env["s3_prefix"],
+            kms_key_id=env["kms_key_id"],
+            compression=env["compression"],
+            compression_level=env["compression_level"],
         )
 
         return cls(
             aurora=aurora,
             table=table,
             s3=s3,
-            dynamodb_table=os.environ["DYNAMODB_TABLE"],
-            timeout_buffer_seconds=int(os.environ.get("TIMEOUT_BUFFER_SECONDS", "60")),
-            dry_run=os.environ.get("DRY_RUN", "false").lower() == "true",
+            dynamodb_table=env["dynamodb_table"],
+            timeout_buffer_seconds=env["timeout_buffer_seconds"],
+            dry_run=env["dry_run"],
         )
+
+
+@lru_cache(maxsize=1)
+def _read_env() -> dict[str, Any]:
+    """Parse and validate the Lambda environment once per container.
+
+    Environment variables do not change for the lifetime of a Lambda
+    container. Tests that modify the environment must call
+    ``_read_env.cache_clear()``.
+
+    Returns:
+        Dict of parsed environment values.
+    """
+    required_vars = [
+        "AURORA_HOST",
+        "AURORA_PORT",
+        "AURORA_DATABASE",
+        "SOURCE_SCHEMA",
+        "SOURCE_TABLE",
+        "SOURCE_COLUMNS",
+        "WATERMARK_COLUMN",
+        "S3_BUCKET",
+        "S3_PREFIX",
+        "DYNAMODB_TABLE",
+    ]
+
+    missing = [v for v in required_vars if not os.environ.get(v)]
+    if missing:
+        raise ConfigurationError(f"Missing required environment variables: {missing}")
+
+    compression = os.environ.get("PARQUET_COMPRESSION", "zstd").lower()
+    level = os.environ.get("PARQUET_COMPRESSION_LEVEL")
+    if level:
+        compression_level: Optional[int] = int(level)
+    else:
+        # Only zstd gets a default level; snappy does not accept one
+        compression_level = 1 if compression == "zstd" else None
+
+    return {
+        "aurora_host": os.environ["AURORA_HOST"],
+        "aurora_port": int(os.environ["AURORA_PORT"]),
+        "aurora_database": os.environ["AURORA_DATABASE"],
+        "table_name": os.environ.get("TABLE_NAME", os.environ["SOURCE_TABLE"].upper() + "_CDC"),
+        "source_schema": os.environ["SOURCE_SCHEMA"],
+        "source_table": os.environ["SOURCE_TABLE"],
+        "source_columns": tuple(c.strip() for c in os.environ["SOURCE_COLUMNS"].split(",")),
+        "watermark_column": os.environ["WATERMARK_COLUMN"],
+        "created_at_column": os.environ.get("CREATED_AT_COLUMN"),
+        "batch_size": int(os.environ.get("BATCH_SIZE", "10000")),
+        "s3_prefix": os.environ["S3_PREFIX"],
+        "s3_bucket": os.environ["S3_BUCKET"],
+        "kms_key_id": os.environ.get("KMS_KEY_ID"),
+        "compression": compression,
+        "compression_level": compression_level,
+        "dynamodb_table": os.environ["DYNAMODB_TABLE"],
+        "timeout_buffer_seconds": int(os.environ.get("TIMEOUT_BUFFER_SECONDS", "60")),
+        "dry_run": os.environ.get("DRY_RUN", "false").lower() == "true",
+    }
@@ -13,6 +13,12 @@ class WatermarkError(CDCExportError):
     pass
 
 
+class ConcurrentModificationError(WatermarkError):
+    """Watermark changed since it was read (optimistic lock lost)."""
+
+    pass
+
+
 class ExtractionError(CDCExportError):
     """Error extracting data from Aurora."""
 
@@ -3,19 +3,30 @@
 import logging
 from contextlib import contextmanager
 from datetime import datetime
-from typing import Any, Generator, Optional
+from decimal import Decimal
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Generator, Optional
 
 import psycopg2
-import psycopg2.extras
 
 from .config import AuroraConfig, TableConfig
 from .exceptions import ExtractionError
 
+if TYPE_CHECKING:
+    import pyarrow as pa
+
 logger = logging.getLogger(__name__)
 
+# PostgreSQL type OID of NUMERIC, as reported in cursor.description
+NUMERIC_OID = 1700
+
 # Global connection for Lambda warm starts
 _connection = None
 
+# Memory budget for one fetched batch; caps rows per batch for wide tables
+FETCH_TARGET_BYTES = 16 * 1024 * 1024
+MIN_FETCH_ROWS = 1000
+
 
 def get_connection(config: AuroraConfig) -> psycopg2.extensions.connection:
     """Get or create a database connection (reused across warm starts).
@@ -77,6 +88,9 @@ def server_cursor(
 ) -> Generator[psycopg2.extensions.cursor, None, None]:
     """Create a server-side cursor for streaming large result sets.
 
+    Rows come back as plain tuples; callers use ``cursor.description`` for
+    column names instead of paying for a dict per row.
+
     Args:
         conn: Database connection.
         name: Cursor name.
@@ -85,7 +99,7 @@ def server_cursor(
     Yields:
         psycopg2 cursor object.
     """
-    cursor = conn.cursor(name=name, cursor_factory=psycopg2.extras.RealDictCursor)
+    cursor = conn.cursor(name=name)
     cursor.itersize = batch_size
     try:
         yield cursor
@@ -93,6 +107,133 @@ def server_cursor(
         cursor.close()
 
 
+@lru_cache(maxsize=16)
+def _compose_query(
+    full_load: bool,
+    columns: tuple[str, ...],
+    table: str,
+    wm_col: str,
+    created_col: Optional[str],
+) -> str:
+    """Compose the extraction SQL for a table.
+
+    The text depends only on table configuration, so it is built once per
+    container and the watermark is always passed as a bound parameter.
+
+    Args:
+        full_load: True to select every row, False for an incremental load.
+        columns: Source columns to select.
+        table: Fully qualified table name.
+        wm_col: Watermark column.
+        created_col: Optional created-at column used to derive the op code.
+
+    Returns:
+        The query string.
+    """
+    column_list = ", ".join(columns)
+
+    # Build OP column expression
+    if created_col:
+        op_expr = f"""
+            CASE
+                WHEN {created_col} = {wm_col} THEN 'I'
+                ELSE 'U'
+            END AS op
+        """
+    else:
+        op_expr = "'U' AS op"
+
+    if full_load:
+        return f"""
+            SELECT {column_list}, {wm_col} AS commit_ts, 'I' AS op
+            FROM {table}
+            ORDER BY {wm_col}
+        """
+
+    return f"""
+        SELECT {column_list}, {wm_col} AS commit_ts, {op_expr}
+        FROM {table}
+        WHERE {wm_col} > %(watermark)s
+        ORDER BY {wm_col}
+    """
+
+
+def _column_types(description) -> list[Optional["pa.DataType"]]:
+    """Derive fixed Arrow types for columns whose values would not pin one.
+
+    Arrow infers a decimal's precision and scale from the values in each
+    batch, so a NUMERIC column would change type from batch to batch. Columns
+    declared NUMERIC(p, s) with p <= 38 are typed as decimal128(p, s) instead;
+    every other column (None) is inferred from its values.
+
+    Args:
+        description: ``cursor.description`` of the extraction query.
+
+    Returns:
+        One Arrow type, or None, per column.
+    """
+    import pyarrow as pa
+
+    types: list[Optional[pa.DataType]] = []
+    for column in description:
+        precision = column[4] if len(column) > 5 and column[1] == NUMERIC_OID else None
+        if precision is not None and precision <= 38:
+            types.append(pa.decimal128(column[4], column[5] or 0))
+        else:
+            types.append(None)
+    return types
+
+
+def _to_record_batch(
+    rows: list[tuple],
+    names: list[str],
+    types: Optional[list[Optional["pa.DataType"]]] = None,
+) -> "pa.RecordBatch":
+    """Transpose cursor tuples into an Arrow record batch.
+
+    Args:
+        rows: Rows as returned by a tuple cursor.
+        names: Column names from ``cursor.description``.
+        types: Fixed column types from _column_types (None infers every column).
+
+    Returns:
+        PyArrow RecordBatch with one typed array per column.
+    """
+    import pyarrow as pa
+
+    types = types or [None] * len(names)
+    columns = [
+        _to_array(name, values, type_) for name, values, type_ in zip(names, zip(*rows), types)
+    ]
+    return pa.RecordBatch.from_arrays(columns, names=names)
+
+
+def _to_array(name: str, values: tuple, type_: Optional["pa.DataType"] = None) -> "pa.Array":
+    """Convert one column's values to an Arrow array.
+
+    PostgreSQL NUMERIC allows NaN, which Arrow decimals cannot hold; NaN
+    values are loaded as NULL.
+
+    Raises:
+        ExtractionError: If the column cannot be converted.
+    """
+    import pyarrow as pa
+
+    try:
+        return pa.array(values, type=type_)
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        error = e
+
+    nan_free = [None if isinstance(v, Decimal) and v.is_nan() else v for v in values]
+    if nan_free != list(values):
+        logger.warning("Loading NaN values in column %s as NULL", name)
+        try:
+            return pa.array(nan_free, type=type_)
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            error = e
+    raise ExtractionError(f"Failed to convert column {name}: {error}") from error
+
+
 class DataExtractor:
     """Extracts data from Aurora PostgreSQL using watermark-based queries."""
 
@@ -106,6 +247,22 @@ class DataExtractor:
         self.aurora_config = aurora_config
         self.table_config = table_config
         self._conn = None
+        self._avg_row_bytes: Optional[int] = None
+
+    def refresh(self, aurora_config: AuroraConfig, table_config: TableConfig) -> None:
+        """Prepare a cached extractor for a new invocation.
+
+        Picks up per-invocation config (event overrides, rotated credentials)
+        and drops the connection handle so the next query goes through
+        get_connection, which re-validates it after a warm start or failover.
+
+        Args:
+            aurora_config: Aurora connection configuration.
+            table_config: Table extraction configuration.
+        """
+        self.aurora_config = aurora_config
+        self.table_config = table_config
+        self._conn = None
 
     def _get_connection(self) -> psycopg2.extensions.connection:
         """Get database connection."""
@@ -122,57 +279,35 @@ class DataExtractor:
         Returns:
             Tuple of (query_string, parameters).
         """
-        columns = ", ".join(self.table_config.source_columns)
-        table = self.table_config.full_table_name
-        wm_col = self.table_config.watermark_column
-        created_col = self.table_config.created_at_column
-
-        # Build OP column expression
-        if created_col:
-            op_expr = f"""
-                CASE
-                    WHEN {created_col} = {wm_col} THEN 'I'
-                    ELSE 'U'
-                END AS op
-            """
-        else:
-            op_expr = "'U' AS op"
-
-        if watermark is None:
-            # Full load
-            query = f"""
-                SELECT {columns}, {wm_col} AS commit_ts, 'I' AS op
-                FROM {table}
-                ORDER BY {wm_col}
-            """
-            params = {}
-        else:
-            # Incremental load
-            query = f"""
-                SELECT {columns}, {wm_col} AS commit_ts, {op_expr}
-                FROM {table}
-                WHERE {wm_col} > %(watermark)s
-                ORDER BY {wm_col}
-            """
-            params = {"watermark": watermark}
-
+        query = _compose_query(
+            watermark is None,
+            tuple(self.table_config.source_columns),
+            self.table_config.full_table_name,
+            self.table_config.watermark_column,
+            self.table_config.created_at_column,
+        )
+        params = {} if watermark is None else {"watermark": watermark}
         return query, params
 
     def extract_batches(
         self, watermark: Optional[datetime], batch_size: Optional[int] = None
-    ) -> Generator[tuple[list[dict[str, Any]], datetime], None, None]:
+    ) -> Generator[tuple["pa.RecordBatch", datetime], None, None]:
         """Extract data in batches using a server-side cursor.
 
+        Rows are transposed straight from cursor tuples into Arrow columns,
+        so no per-row dict is ever built. Because the query orders by the
+        watermark column, the yielded watermark is monotonically
+        non-decreasing across batches.
+
         Args:
             watermark: The watermark timestamp (None for full load).
             batch_size: Override batch size (uses config default if None).
 
         Yields:
-            Tuples of (batch_of_rows, max_watermark_in_batch).
+            Tuples of (record_batch, max_watermark_in_batch).
         """
-        batch_size = batch_size or self.table_config.batch_size
+        batch_size = self.fetch_size(batch_size or self.table_config.batch_size)
         query, params = self.build_query(watermark)
-        wm_col = self.table_config.watermark_column
 
         conn = self._get_connection()
 
@@ -180,28 +315,84 @@ class DataExtractor:
             with server_cursor(conn, "cdc_cursor", batch_size) as cursor:
                 cursor.execute(query, params)
 
-                batch = []
+                names: list[str] = []
+                types: list[Optional["pa.DataType"]] = []
+                wm_index = 0
                 max_watermark = watermark
 
-                for row in cursor:
-                    batch.append(dict(row))
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
 
-                    # Track max watermark
-                    row_wm = row.get("commit_ts") or row.get(wm_col.lower())
-                    if row_wm and (max_watermark is None or row_wm > max_watermark):
-                        max_watermark = row_wm
+                    if not names:
+                        names = [desc[0] for desc in cursor.description]
+                        types = _column_types(cursor.description)
+                        wm_index = names.index("commit_ts")
 
-                    if len(batch) >= batch_size:
-                        yield batch, max_watermark
-                        batch = []
+                    # Rows are ordered by the watermark column, so the last
+                    # non-NULL value is the batch max (NULLs sort last).
+                    for row in reversed(rows):
+                        if row[wm_index] is not None:
+                            max_watermark = row[wm_index]
+                            break
 
-                # Yield remaining rows
-                if batch:
-                    yield batch, max_watermark
+                    yield _to_record_batch(rows, names, types), max_watermark
 
         except psycopg2.Error as e:
             raise ExtractionError(f"Failed to extract data: {e}") from e
 
+    def estimate_row_bytes(self) -> Optional[int]:
+        """Estimate the average size of an extracted row.
+
+        Samples up to 100 rows of the projected columns once and caches the
+        result on the extractor.
+
+        Returns:
+            Average row size in bytes, or None if it cannot be estimated.
+        """
+        if self._avg_row_bytes is not None:
+            return self._avg_row_bytes or None
+
+        columns = ", ".join(self.table_config.source_columns)
+        table = self.table_config.full_table_name
+
+        conn = self._get_connection()
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT AVG(pg_column_size(s.*))::int "
+                    f"FROM (SELECT {columns} FROM {table} LIMIT 100) s"
+                )
+                avg_bytes = cursor.fetchone()[0]
+        except psycopg2.Error as e:
+            logger.warning("Could not estimate row size for %s: %s", table, e)
+            avg_bytes = None
+
+        # 0 marks "estimated, unknown" so the query is not retried
+        self._avg_row_bytes = avg_bytes or 0
+        return avg_bytes or None
+
+    def fetch_size(self, batch_size: int) -> int:
+        """Cap a batch size so one fetch stays within FETCH_TARGET_BYTES.
+
+        Args:
+            batch_size: Requested rows per batch.
+
+        Returns:
+            Rows to fetch per batch.
+        """
+        avg_bytes = self.estimate_row_bytes()
+        if not avg_bytes:
+            return batch_size
+
+        budget_rows = max(MIN_FETCH_ROWS, FETCH_TARGET_BYTES // avg_bytes)
+        if budget_rows < batch_size:
+            logger.info("Capping batch size at %d rows (avg row %d bytes)", budget_rows, avg_bytes)
+            return budget_rows
+        return batch_size
+
     def get_row_count(self, watermark: Optional[datetime] = None) -> int:
         """Get count of rows to be extracted.
 
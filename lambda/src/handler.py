@@ -1,10 +1,21 @@
-"""Lambda handler for Aurora to S3 CDC export."""
+"""Lambda handler for Aurora to S3 CDC export.
+
+Memory sizing: the export is dominated by psycopg2 fetches, Arrow/Parquet
+encoding and S3 uploads. Lambda allocates CPU in proportion to memory and
+reaches one full vCPU at 1769 MB, so the Terraform default is 1769 MB. The
+expected gains (faster pyarrow and psycopg2 imports on cold start, more
+encoding throughput) have not been measured; confirm them with
+aws-lambda-power-tuning against a representative table before relying on
+the default or moving a function off it.
+"""
 
 import json
 import logging
 import os
+import threading
 import time
 import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
 from typing import Any, Optional
 
@@ -13,6 +24,7 @@ import boto3
 from .config import AuroraConfig, LambdaConfig, S3Config, TableConfig
 from .exceptions import (
     CDCExportError,
+    ConcurrentModificationError,
     ConfigurationError,
     TimeoutApproachingError,
 )
@@ -21,30 +33,66 @@ from .watermark import WatermarkManager
 from .writer import S3ParquetWriter
 
 logger = logging.getLogger()
-logger.setLevel(logging.INFO)
 
-# Cache for secrets
+
+def _log_level(name: str) -> int:
+    """Map a LOG_LEVEL value to a logging level, falling back to INFO if unknown."""
+    level = logging.getLevelName(name.upper())
+    if isinstance(level, int):
+        return level
+    logger.warning("Unknown LOG_LEVEL %r, using INFO", name)
+    return logging.INFO
+
+
+logger.setLevel(_log_level(os.environ.get("LOG_LEVEL", "INFO")))
+
+# Parse the environment during INIT so the first invocation finds it cached.
+# Outside Lambda (tests, tooling) the variables may be missing; build_config
+# raises the real error later if they still are.
+try:
+    LambdaConfig.from_env()
+except ConfigurationError:
+    pass
+
+# Extractors reused across warm starts, keyed by (host, database, table)
+_extractor_cache: dict[tuple[str, str, str], DataExtractor] = {}
+
+# Cache for secrets (reused across warm starts until the TTL expires)
 _cached_secret: Optional[dict] = None
+_cached_secret_at: float = 0.0
+_secret_lock = threading.Lock()
+
+# Secrets Manager client reused across warm starts
+_secrets_client = None
 
 
 def get_aurora_secret(secret_arn: str) -> dict:
     """Retrieve Aurora credentials from Secrets Manager.
 
+    The secret is cached at module scope for SECRET_CACHE_TTL_SECONDS
+    (default 300) so warm invocations skip the Secrets Manager round-trip
+    while still picking up rotated credentials.
+
     Args:
         secret_arn: ARN of the secret.
 
     Returns:
         Dict with username and password.
     """
-    global _cached_secret
+    global _cached_secret, _cached_secret_at, _secrets_client
 
-    if _cached_secret is not None:
-        return _cached_secret
+    ttl = int(os.environ.get("SECRET_CACHE_TTL_SECONDS", "300"))
 
-    client = boto3.client("secretsmanager")
-    response = client.get_secret_value(SecretId=secret_arn)
-    _cached_secret = json.loads(response["SecretString"])
-    return _cached_secret
+    with _secret_lock:
+        if _cached_secret is not None and time.monotonic() - _cached_secret_at < ttl:
+            return _cached_secret
+
+        if _secrets_client is None:
+            _secrets_client = boto3.client("secretsmanager")
+        response = _secrets_client.get_secret_value(SecretId=secret_arn)
+        _cached_secret = json.loads(response["SecretString"])
+        _cached_secret_at = time.monotonic()
+        return _cached_secret
 
 
 def build_config(event: dict[str, Any]) -> LambdaConfig:
@@ -78,6 +126,24 @@ def build_config(event: dict[str, Any]) -> LambdaConfig:
     return config
 
 
+def get_extractor(config: LambdaConfig) -> DataExtractor:
+    """Get the cached extractor for this table, creating it on first use.
+
+    Args:
+        config: Configuration for the current invocation.
+
+    Returns:
+        DataExtractor refreshed with the current configuration.
+    """
+    key = (config.aurora.host, config.aurora.database, config.table.full_table_name)
+    extractor = _extractor_cache.get(key)
+    if extractor is None:
+        extractor = _extractor_cache[key] = DataExtractor(config.aurora, config.table)
+    else:
+        extractor.refresh(config.aurora, config.table)
+    return extractor
+
+
 def check_timeout(context, buffer_seconds: int) -> bool:
     """Check if Lambda timeout is approaching.
 
@@ -95,6 +161,86 @@ def check_timeout(context, buffer_seconds: int) -> bool:
     return remaining_ms < (buffer_seconds * 1000)
 
 
+def _no_rows_result(table_name: str, execution_id: str) -> dict[str, Any]:
+    """Build the response for an invocation that found nothing to export."""
+    return {
+        "statusCode": 200,
+        "body": {
+            "table_name": table_name,
+            "rows_exported": 0,
+            "files_written": 0,
+            "execution_id": execution_id,
+            "message": "No new rows to export",
+        },
+    }
+
+
+def commit_watermark(
+    watermark_mgr: WatermarkManager,
+    table_name: str,
+    new_watermark: datetime,
+    previous_watermark: Optional[datetime],
+    **stats: Any,
+) -> bool:
+    """Advance the watermark, resolving one lost optimistic lock.
+
+    The watermark is read eventually consistently, so a conditional-check
+    failure may just mean the read was stale. On conflict the watermark is
+    re-read consistently: if it still lies inside the window this run
+    exported (previous_watermark, new_watermark) the update is retried once
+    against it; otherwise another run already covered this window, or the
+    state moved in a way this run cannot account for, and the update is
+    abandoned.
+
+    A full load (previous_watermark None) accepts any stored watermark
+    behind new_watermark, so it overwrites one that another run advanced
+    concurrently, as long as it is still behind this run's.
+
+    Args:
+        watermark_mgr: Watermark manager.
+        table_name: The table identifier.
+        new_watermark: Max watermark of the exported rows.
+        previous_watermark: Watermark the export started from (None for full load).
+        **stats: rows_exported, execution_id and duration_seconds.
+
+    Returns:
+        True if the watermark was updated, False if the update was abandoned.
+    """
+    try:
+        watermark_mgr.update_watermark(
+            table_name=table_name,
+            new_watermark=new_watermark,
+            previous_watermark=previous_watermark,
+            **stats,
+        )
+        return True
+    except ConcurrentModificationError:
+        current = watermark_mgr.get_watermark(table_name, consistent_read=True)
+
+    window_applies = (
+        current is not None
+        and current < new_watermark
+        and (previous_watermark is None or current >= previous_watermark)
+    )
+    if not window_applies:
+        logger.warning(
+            "Watermark for %s moved to %s during export; keeping it (this run reached %s)",
+            table_name,
+            current,
+            new_watermark,
+        )
+        return False
+
+    logger.info("Stale watermark read for %s, retrying update from %s", table_name, current)
+    watermark_mgr.update_watermark(
+        table_name=table_name,
+        new_watermark=new_watermark,
+        previous_watermark=current,
+        **stats,
+    )
+    return True
+
+
 def handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
     """Lambda entry point for CDC export.
 
@@ -103,6 +249,7 @@ def handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
         force_full_load: If true, ignore existing watermark (optional)
         batch_size: Override batch size (optional)
         dry_run: If true, extract but don't write (optional)
+        skip_count: If true, skip the COUNT(*) pre-query (optional)
 
     Args:
         event: Lambda event payload.
@@ -112,7 +259,7 @@ def handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
         Dict with export results.
     """
     start_time = time.time()
-    execution_id = str(uuid.uuid4())[:8]
+    execution_id = uuid.uuid4().hex[:8]
 
     logger.info("Starting CDC export, execution_id=%s, event=%s", execution_id, event)
 
@@ -122,6 +269,9 @@ def handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
         raise ConfigurationError("table_name is required in event payload")
 
     force_full_load = event.get("force_full_load", False)
+    skip_count = event.get("skip_count", False)
+
+    writer: Optional[S3ParquetWriter] = None
 
     try:
         # Build configuration
@@ -129,7 +279,7 @@ def handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
 
         # Initialize components
         watermark_mgr = WatermarkManager(config.dynamodb_table)
-        extractor = DataExtractor(config.aurora, config.table)
+        extractor = get_extractor(config)
         writer = S3ParquetWriter(config.s3, config.table, execution_id)
 
         # Get current watermark
@@ -141,63 +291,89 @@ def handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
             watermark = watermark_mgr.get_watermark(table_name)
             previous_watermark = watermark
 
-        # Count rows to export
-        row_count = extractor.get_row_count(watermark)
-        logger.info("Found %d rows to export for %s", row_count, table_name)
-
-        if row_count == 0:
-            return {
-                "statusCode": 200,
-                "body": {
-                    "table_name": table_name,
-                    "rows_exported": 0,
-                    "files_written": 0,
-                    "execution_id": execution_id,
-                    "message": "No new rows to export",
-                },
-            }
+        # Count rows to export (optional; the count is only used for logging)
+        if skip_count:
+            row_count = None
+            logger.info("Skipping row count for %s, row_count=unknown", table_name)
+        else:
+            row_count = extractor.get_row_count(watermark)
+            logger.info("Found %d rows to export for %s", row_count, table_name)
+
+            if row_count == 0:
+                return _no_rows_result(table_name, execution_id)
 
         # Export in batches
         total_rows = 0
         max_watermark = watermark
         timeout_reached = False
 
-        for batch, batch_max_wm in extractor.extract_batches(watermark):
-            # Check timeout
-            if check_timeout(context, config.timeout_buffer_seconds):
-                logger.warning(
-                    "Timeout approaching after %d rows, stopping gracefully",
+        # Upload batches in the background while the next one is fetched
+        write_concurrency = int(os.environ.get("S3_WRITE_CONCURRENCY", "4"))
+        pending: list[Future] = []
+
+        with ThreadPoolExecutor(max_workers=write_concurrency) as pool:
+            for batch, batch_max_wm in extractor.extract_batches(watermark):
+                # Check timeout
+                if check_timeout(context, config.timeout_buffer_seconds):
+                    logger.warning(
+                        "Timeout approaching after %d rows, stopping gracefully",
+                        total_rows,
+                    )
+                    timeout_reached = True
+                    break
+
+                # Write batch
+                if not config.dry_run:
+                    # Bound memory: wait for the oldest upload before queueing more
+                    if len(pending) >= write_concurrency:
+                        pending.pop(0).result()
+                    pending.append(pool.submit(writer.write_batch, batch))
+                else:
+                    logger.info("Dry run: would write %d rows", len(batch))
+
+                total_rows += len(batch)
+
+                # extract_batches yields monotonically non-decreasing watermarks
+                if batch_max_wm is not None:
+                    max_watermark = batch_max_wm
+
+                logger.info(
+                    "Processed %d/%s rows",
                     total_rows,
+                    row_count if row_count is not None else "unknown",
                 )
-                timeout_reached = True
-                break
 
-            # Write batch
-            if not config.dry_run:
-                writer.write_batch(batch)
-            else:
-                logger.info("Dry run: would write %d rows", len(batch))
+            # Every queued batch must reach the writer before its file is completed
+            for future in as_completed(pending):
+                future.result()
 
-            total_rows += len(batch)
+        # The open file must be in S3 before the watermark moves
+        if not config.dry_run:
+            writer.flush()
 
-            # Track max watermark
-            if batch_max_wm and (max_watermark is None or batch_max_wm > max_watermark):
-                max_watermark = batch_max_wm
-
-            logger.info("Processed %d/%d rows", total_rows, row_count)
+        if total_rows == 0 and not timeout_reached:
+            return _no_rows_result(table_name, execution_id)
 
         # Update watermark
         duration = time.time() - start_time
 
+        watermark_updated = False
         if total_rows > 0 and max_watermark and not config.dry_run:
-            watermark_mgr.update_watermark(
-                table_name=table_name,
-                new_watermark=max_watermark,
+            watermark_updated = commit_watermark(
+                watermark_mgr,
+                table_name,
+                max_watermark,
+                previous_watermark,
                 rows_exported=total_rows,
                 execution_id=execution_id,
                 duration_seconds=duration,
-                previous_watermark=previous_watermark,
             )
+            if not watermark_updated:
+                logger.warning(
+                    "Exported %d rows for %s but left the watermark unchanged",
+                    total_rows,
+                    table_name,
+                )
 
         result = {
             "statusCode": 200,
@@ -208,6 +384,7 @@ def handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
                 "execution_id": execution_id,
                 "duration_seconds": round(duration, 2),
                 "new_watermark": max_watermark.isoformat() if max_watermark else None,
+                "watermark_updated": watermark_updated,
                 "timeout_reached": timeout_reached,
                 "dry_run": config.dry_run,
             },
@@ -220,7 +397,7 @@ def handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
         return result
 
     except CDCExportError as e:
-        logger.error("CDC export failed: %s", str(e))
+        logger.error("CDC export failed: %s", e)
         raise
 
     except Exception as e:
@@ -228,8 +405,10 @@ def handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
         raise CDCExportError(f"Unexpected error: {e}") from e
 
     finally:
+        # Discard a file left open by a failed export; no-op after flush()
+        if writer is not None:
+            writer.abort()
         # Don't close connection - keep it for warm starts
-        pass
 
 
 def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
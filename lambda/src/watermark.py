@@ -1,17 +1,48 @@
 """DynamoDB watermark state management."""
 
 import logging
+import time
 from datetime import datetime, timezone
-from decimal import Decimal
 from typing import Any, Optional
 
 import boto3
 from botocore.exceptions import ClientError
 
-from .exceptions import WatermarkError
+from .exceptions import ConcurrentModificationError, WatermarkError
 
 logger = logging.getLogger(__name__)
 
+# BatchGetItem accepts at most 100 keys per request
+BATCH_GET_MAX_KEYS = 100
+
+# Unprocessed BatchGetItem keys are retried with capped exponential backoff
+BATCH_GET_MAX_ATTEMPTS = 5
+BATCH_GET_BACKOFF_SECONDS = 0.05
+BATCH_GET_MAX_BACKOFF_SECONDS = 1.0
+
+# DynamoDB client reused across warm starts
+_dynamodb_client = None
+
+
+def _get_dynamodb_client():
+    """Get or create the module-level DynamoDB client."""
+    global _dynamodb_client
+    if _dynamodb_client is None:
+        _dynamodb_client = boto3.client("dynamodb")
+    return _dynamodb_client
+
+
+def _updated_at(item: dict[str, Any]) -> Optional[str]:
+    """Return an item's update time as ISO-8601.
+
+    Items store ``updated_at_ms`` (epoch milliseconds); items not rewritten
+    since that change still carry the older ``updated_at`` string.
+    """
+    if "updated_at_ms" in item:
+        millis = int(item["updated_at_ms"]["N"])
+        return datetime.fromtimestamp(millis / 1000, tz=timezone.utc).isoformat()
+    return item.get("updated_at", {}).get("S")
+
 
 class WatermarkManager:
     """Manages watermark state in DynamoDB with optimistic locking."""
@@ -24,13 +55,18 @@ class WatermarkManager:
             dynamodb_client: Optional boto3 DynamoDB client (for testing).
         """
         self.table_name = table_name
-        self.dynamodb = dynamodb_client or boto3.client("dynamodb")
+        self.dynamodb = dynamodb_client or _get_dynamodb_client()
 
-    def get_watermark(self, table_name: str) -> Optional[datetime]:
+    def get_watermark(self, table_name: str, consistent_read: bool = False) -> Optional[datetime]:
         """Get the current watermark for a table.
 
+        Reads are eventually consistent by default: a stale value only makes
+        the optimistic lock in update_watermark fail, and the caller re-reads
+        with ``consistent_read=True`` to resolve the conflict.
+
         Args:
             table_name: The table identifier (e.g., "ORDERS_CDC").
+            consistent_read: Use a strongly consistent read.
 
         Returns:
             The watermark datetime, or None if no watermark exists.
@@ -39,7 +75,7 @@ class WatermarkManager:
             response = self.dynamodb.get_item(
                 TableName=self.table_name,
                 Key={"table_name": {"S": table_name}},
-                ConsistentRead=True,
+                ConsistentRead=consistent_read,
             )
 
             item = response.get("Item")
@@ -47,14 +83,71 @@ class WatermarkManager:
                 logger.info("No watermark found for table %s, will do full load", table_name)
                 return None
 
-            watermark_str = item["watermark"]["S"]
-            watermark = datetime.fromisoformat(watermark_str.replace("Z", "+00:00"))
+            # Python 3.11+ parses a trailing "Z" natively
+            watermark = datetime.fromisoformat(item["watermark"]["S"])
             logger.info("Retrieved watermark for %s: %s", table_name, watermark)
             return watermark
 
         except ClientError as e:
             raise WatermarkError(f"Failed to get watermark: {e}") from e
 
+    def get_watermarks(self, table_names: list[str]) -> dict[str, Optional[datetime]]:
+        """Get the current watermarks for several tables in one round-trip.
+
+        Uses BatchGetItem (up to 100 keys per request) instead of one
+        GetItem per table. Keys DynamoDB returns as unprocessed are
+        requested again after an exponential backoff.
+
+        Args:
+            table_names: The table identifiers.
+
+        Returns:
+            Dict mapping each table identifier to its watermark, or None if
+            no watermark exists.
+
+        Raises:
+            WatermarkError: If the read fails or keys are still unprocessed
+                after BATCH_GET_MAX_ATTEMPTS requests.
+        """
+        watermarks: dict[str, Optional[datetime]] = dict.fromkeys(table_names)
+        names = list(watermarks)
+
+        try:
+            for start in range(0, len(names), BATCH_GET_MAX_KEYS):
+                end = start + BATCH_GET_MAX_KEYS
+                request = {
+                    self.table_name: {
+                        "Keys": [{"table_name": {"S": name}} for name in names[start:end]],
+                        "ProjectionExpression": "table_name, watermark",
+                    }
+                }
+                for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+                    if attempt:
+                        # Unprocessed keys mean the table is throttling; give it room
+                        time.sleep(
+                            min(
+                                BATCH_GET_BACKOFF_SECONDS * 2 ** (attempt - 1),
+                                BATCH_GET_MAX_BACKOFF_SECONDS,
+                            )
+                        )
+                    response = self.dynamodb.batch_get_item(RequestItems=request)
+                    for item in response.get("Responses", {}).get(self.table_name, []):
+                        watermarks[item["table_name"]["S"]] = datetime.fromisoformat(
+                            item["watermark"]["S"]
+                        )
+                    request = response.get("UnprocessedKeys")
+                    if not request:
+                        break
+                else:
+                    raise WatermarkError(
+                        f"Watermarks still unprocessed after {BATCH_GET_MAX_ATTEMPTS} attempts"
+                    )
+
+        except ClientError as e:
+            raise WatermarkError(f"Failed to get watermarks: {e}") from e
+
+        return watermarks
+
     def update_watermark(
         self,
         table_name: str,
@@ -73,36 +166,44 @@ class WatermarkManager:
             execution_id: Unique execution identifier.
             duration_seconds: How long the export took.
             previous_watermark: Expected current watermark (for optimistic locking).
+
+        Raises:
+            ConcurrentModificationError: If the stored watermark no longer
+                matches ``previous_watermark``.
         """
-        now = datetime.now(timezone.utc).isoformat()
+        now_ms = time.time_ns() // 1_000_000
         watermark_str = new_watermark.isoformat()
 
-        item = {
-            "table_name": {"S": table_name},
-            "watermark": {"S": watermark_str},
-            "rows_exported": {"N": str(rows_exported)},
-            "execution_id": {"S": execution_id},
-            "duration_seconds": {"N": str(Decimal(str(duration_seconds)))},
-            "updated_at": {"S": now},
+        # Only the changed attributes are sent; version counts successful updates
+        values = {
+            ":wm": {"S": watermark_str},
+            ":rows": {"N": str(rows_exported)},
+            ":exec": {"S": execution_id},
+            ":dur": {"N": f"{duration_seconds:.3f}"},
+            ":ts": {"N": str(now_ms)},
+            ":one": {"N": "1"},
         }
 
+        if previous_watermark is None:
+            # First run - ensure we don't overwrite an existing watermark
+            condition = "attribute_not_exists(table_name)"
+        else:
+            # Update with optimistic locking
+            condition = "watermark = :prev"
+            values[":prev"] = {"S": previous_watermark.isoformat()}
+
         try:
-            if previous_watermark is None:
-                # First run - ensure we don't overwrite an existing watermark
-                self.dynamodb.put_item(
-                    TableName=self.table_name,
-                    Item=item,
-                    ConditionExpression="attribute_not_exists(table_name)",
-                )
-            else:
-                # Update with optimistic locking
-                previous_str = previous_watermark.isoformat()
-                self.dynamodb.put_item(
-                    TableName=self.table_name,
-                    Item=item,
-                    ConditionExpression="watermark = :prev",
-                    ExpressionAttributeValues={":prev": {"S": previous_str}},
-                )
+            self.dynamodb.update_item(
+                TableName=self.table_name,
+                Key={"table_name": {"S": table_name}},
+                UpdateExpression=(
+                    "SET watermark = :wm, rows_exported = :rows, execution_id = :exec, "
+                    "duration_seconds = :dur, updated_at_ms = :ts "
+                    "REMOVE updated_at ADD version :one"
+                ),
+                ConditionExpression=condition,
+                ExpressionAttributeValues=values,
+            )
 
             logger.info(
                 "Updated watermark for %s: %s (exported %d rows)",
@@ -113,7 +214,7 @@ class WatermarkManager:
 
         except ClientError as e:
             if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
-                raise WatermarkError(
+                raise ConcurrentModificationError(
                     f"Concurrent modification detected for {table_name}. "
                     "Another Lambda may have updated the watermark."
                 ) from e
@@ -132,7 +233,7 @@ class WatermarkManager:
             response = self.dynamodb.get_item(
                 TableName=self.table_name,
                 Key={"table_name": {"S": table_name}},
-                ConsistentRead=True,
+                ConsistentRead=False,
             )
 
             item = response.get("Item")
@@ -141,13 +242,12 @@ class WatermarkManager:
 
             return {
                 "table_name": item["table_name"]["S"],
-                "watermark": datetime.fromisoformat(
-                    item["watermark"]["S"].replace("Z", "+00:00")
-                ),
+                "watermark": datetime.fromisoformat(item["watermark"]["S"]),
                 "rows_exported": int(item.get("rows_exported", {}).get("N", 0)),
                 "execution_id": item.get("execution_id", {}).get("S"),
                 "duration_seconds": float(item.get("duration_seconds", {}).get("N", 0)),
-                "updated_at": item.get("updated_at", {}).get("S"),
+                "updated_at": _updated_at(item),
+                "version": int(item.get("version", {}).get("N", 0)),
             }
 
         except ClientError as e:
@@ -1,23 +1,235 @@
-"""S3 Parquet writer for CDC data."""
+"""S3 Parquet writer for CDC data.
+
+pyarrow is imported on first write rather than at module load:
+most scheduled invocations find no new rows and return before writing, so
+they should not pay the import cost during INIT.
+"""
 
-import io
 import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Any, Optional
+from typing import TYPE_CHECKING, Any, Optional, Union
 
 import boto3
-import pandas as pd
-import pyarrow as pa
-import pyarrow.parquet as pq
 
 from .config import S3Config, TableConfig
 from .exceptions import WriterError
 
+if TYPE_CHECKING:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
 logger = logging.getLogger(__name__)
 
+# Multipart part size (S3 minimum is 5 MiB) and parts uploaded in parallel
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+MULTIPART_CONCURRENCY = 4
+
+# Batches are appended to one file until it reaches this size; Snowflake
+# loads files of roughly 100-250 MB compressed most efficiently
+DEFAULT_FILE_TARGET_BYTES = 128 * 1024 * 1024
+
+# Upper bound on rows per Parquet encoding batch
+PARQUET_MAX_WRITE_BATCH_SIZE = 16384
+
+# S3 client reused across warm starts
+_s3_client = None
+
+
+def _get_s3_client():
+    """Get or create the module-level S3 client."""
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = boto3.client("s3")
+    return _s3_client
+
+
+def _to_utc_timestamp(values: "pa.ChunkedArray") -> "pa.ChunkedArray":
+    """Parse ISO-8601 strings into UTC timestamps; naive values are taken as UTC."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    try:
+        return pc.cast(values, pa.timestamp("us", tz="UTC"))
+    except pa.ArrowInvalid:
+        return pc.assume_timezone(pc.cast(values, pa.timestamp("us")), "UTC")
+
+
+def _type_fits(batch_type: "pa.DataType", file_type: "pa.DataType") -> bool:
+    """Return True if batch_type's values can be cast to file_type without loss."""
+    import pyarrow as pa
+
+    if batch_type.equals(file_type) or pa.types.is_null(batch_type):
+        return True
+    if pa.types.is_decimal(batch_type) and pa.types.is_decimal(file_type):
+        # Neither fractional nor integer digits may shrink
+        return (
+            batch_type.scale <= file_type.scale
+            and batch_type.precision - batch_type.scale <= file_type.precision - file_type.scale
+        )
+    return False
+
+
+def _castable_without_loss(schema: "pa.Schema", file_schema: "pa.Schema") -> bool:
+    """Return True if a batch with schema can be appended to a file with file_schema.
+
+    Only columns that match exactly, that are all NULL in the batch, or whose
+    decimals fit the file's precision and scale can be cast safely. Anything
+    else (e.g. a struct gaining a field, which a cast would silently drop)
+    needs a new file.
+    """
+    if schema.names != file_schema.names:
+        return False
+    return all(
+        _type_fits(field.type, file_field.type) for field, file_field in zip(schema, file_schema)
+    )
+
+
+class _S3MultipartSink:
+    """Writable file object that streams its bytes to a single S3 object.
+
+    Bytes are buffered until a part fills, then uploaded on a small thread
+    pool while the caller keeps encoding, so at most a few parts are held in
+    memory. Objects smaller than one part are sent with a single PutObject.
+    """
+
+    def __init__(
+        self,
+        s3_client,
+        bucket: str,
+        key: str,
+        extra_args: dict[str, str],
+        part_size: int = DEFAULT_PART_SIZE,
+    ):
+        """Initialize the sink.
+
+        Args:
+            s3_client: boto3 S3 client.
+            bucket: Destination bucket.
+            key: Destination key.
+            extra_args: Extra upload arguments (e.g., SSE-KMS settings).
+            part_size: Bytes per multipart part.
+        """
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.extra_args = extra_args
+        self.part_size = part_size
+        self.closed = False
+        self._buffer = bytearray()
+        self._position = 0
+        self._upload_id: Optional[str] = None
+        # Threads start with the first part, so small files never spawn any
+        self._executor = ThreadPoolExecutor(max_workers=MULTIPART_CONCURRENCY)
+        self._parts: list[Future] = []
+
+    def writable(self) -> bool:
+        """Return True; the sink is write-only."""
+        return True
+
+    def tell(self) -> int:
+        """Return the number of bytes written so far."""
+        return self._position
+
+    def flush(self) -> None:
+        """No-op; parts are flushed as they fill."""
+
+    def write(self, data) -> int:
+        """Buffer data and upload a part whenever one fills."""
+        if self.closed:
+            raise ValueError(f"Write to closed sink for {self.key}")
+        self._buffer += data
+        self._position += len(data)
+        if len(self._buffer) >= self.part_size:
+            self._upload_buffer()
+        return len(data)
+
+    def _upload_buffer(self) -> None:
+        """Hand the buffered bytes to the upload pool as the next part."""
+        if self._upload_id is None:
+            response = self.s3.create_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                ContentType="application/octet-stream",
+                **self.extra_args,
+            )
+            self._upload_id = response["UploadId"]
+
+        # Bound memory: wait for the oldest in-flight part before queueing more
+        if len(self._parts) >= MULTIPART_CONCURRENCY:
+            self._parts[-MULTIPART_CONCURRENCY].result()
+
+        # Hand the filled buffer to the upload thread as-is; no copy
+        part_number = len(self._parts) + 1
+        body, self._buffer = self._buffer, bytearray()
+        self._parts.append(self._executor.submit(self._upload_part, part_number, body))
+
+    def _upload_part(self, part_number: int, body: bytearray) -> dict[str, Any]:
+        """Upload one part and return its completion entry."""
+        response = self.s3.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=body,
+        )
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+    def close(self) -> None:
+        """Upload any remaining bytes and complete the object."""
+        if self.closed:
+            return
+        self.closed = True
+
+        if self._upload_id is None:
+            body, self._buffer = self._buffer, bytearray()
+            self.s3.put_object(
+                Bucket=self.bucket,
+                Key=self.key,
+                Body=body,
+                ContentType="application/octet-stream",
+                **self.extra_args,
+            )
+            return
+
+        try:
+            if self._buffer:
+                self._upload_buffer()
+            parts = [future.result() for future in self._parts]
+            self.s3.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except Exception:
+            self.abort()
+            raise
+        self._executor.shutdown(wait=True)
+
+    def abort(self) -> None:
+        """Abort an in-progress multipart upload, discarding uploaded parts."""
+        self.closed = True
+        self._buffer.clear()
+        if self._upload_id is None:
+            return
+
+        upload_id, self._upload_id = self._upload_id, None
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        try:
+            self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=upload_id)
+        except Exception:
+            logger.warning("Failed to abort multipart upload for %s", self.key)
+
 
 class S3ParquetWriter:
-    """Writes CDC data to S3 in Parquet format."""
+    """Writes CDC data to S3 in Parquet format.
+
+    Batches are streamed as row groups into one open Parquet file, which is
+    uploaded part by part as it grows. A file is completed once it reaches
+    ``file_target_bytes``, when the schema changes, or on flush().
+    """
 
     def __init__(
         self,
@@ -37,30 +249,47 @@ class S3ParquetWriter:
         self.s3_config = s3_config
         self.table_config = table_config
         self.execution_id = execution_id
-        self.s3 = s3_client or boto3.client("s3")
+        self.s3 = s3_client or _get_s3_client()
         self._batch_counter = 0
+        self._counter_lock = threading.Lock()
+        self.part_size = DEFAULT_PART_SIZE
+        self.file_target_bytes = DEFAULT_FILE_TARGET_BYTES
+        # The open file; batches may arrive from several threads
+        self._file_lock = threading.Lock()
+        self._sink: Optional[_S3MultipartSink] = None
+        self._parquet_writer: Optional["pq.ParquetWriter"] = None
+        self._file_rows = 0
+        # Key prefix is fixed for the writer's lifetime
+        self._key_prefix = (
+            f"{s3_config.prefix}/{table_config.source_schema}/{table_config.source_table}/"
+        )
+        # Every file from one execution shares the same UTC load timestamp
+        self._run_timestamp = datetime.now(timezone.utc)
+        # Columns parsed as UTC timestamps when row dicts carry them as strings
+        self._timestamp_columns = frozenset(
+            {"commit_ts", "updated_at", "created_at", table_config.watermark_column}
+            | ({table_config.created_at_column} if table_config.created_at_column else set())
+        )
 
     def _generate_key(self, timestamp: datetime) -> str:
         """Generate S3 key for a Parquet file.
 
         Pattern: {prefix}/{schema}/{table}/LOAD{timestamp}_{execution_id}_{batch}.parquet
         """
-        ts_str = timestamp.strftime("%Y%m%dT%H%M%S")
-        self._batch_counter += 1
-
-        key = (
-            f"{self.s3_config.prefix}/"
-            f"{self.table_config.source_schema}/"
-            f"{self.table_config.source_table}/"
-            f"LOAD{ts_str}_{self.execution_id}_{self._batch_counter:04d}.parquet"
+        # Batches may be written from several threads
+        with self._counter_lock:
+            self._batch_counter = batch_number = self._batch_counter + 1
+
+        return (
+            f"{self._key_prefix}LOAD{timestamp:%Y%m%dT%H%M%S}_"
+            f"{self.execution_id}_{batch_number:04d}.parquet"
         )
-        return key
 
-    def _convert_to_arrow(self, rows: list[dict[str, Any]]) -> pa.Table:
+    def _convert_to_arrow(self, rows: Union["pa.RecordBatch", list[dict[str, Any]]]) -> "pa.Table":
         """Convert rows to PyArrow table.
 
         Args:
-            rows: List of row dictionaries.
+            rows: Record batch from the extractor, or a list of row dictionaries.
 
         Returns:
             PyArrow Table.
@@ -68,78 +297,191 @@ class S3ParquetWriter:
         if not rows:
             raise WriterError("Cannot write empty batch")
 
-        df = pd.DataFrame(rows)
+        import pyarrow as pa
+
+        if isinstance(rows, pa.RecordBatch):
+            # Already columnar and typed by the extractor
+            table = pa.Table.from_batches([rows])
+        else:
+            # Inferred per batch: forcing an earlier batch's schema would truncate
+            # widened values and drop new keys. write_batch reconciles the types.
+            table = pa.Table.from_pylist(rows)
 
-        # Ensure consistent column order and types
-        for col in df.columns:
-            if df[col].dtype == "object":
-                # Check if it's a datetime column stored as string
-                if col in ("commit_ts", "updated_at", "created_at"):
-                    df[col] = pd.to_datetime(df[col], utc=True)
+            # Timestamp columns that arrive as ISO strings become UTC timestamps
+            for index, field in enumerate(table.schema):
+                if field.name in self._timestamp_columns and pa.types.is_string(field.type):
+                    table = table.set_column(
+                        index, field.name, _to_utc_timestamp(table.column(index))
+                    )
 
-        return pa.Table.from_pandas(df, preserve_index=False)
+        # The CDC op code (I/U/D) is always dictionary-encoded
+        index = table.schema.get_field_index("op")
+        if index != -1 and pa.types.is_string(table.schema.field(index).type):
+            table = table.set_column(
+                index, "op", table.column(index).cast(pa.dictionary(pa.int8(), pa.string()))
+            )
+
+        return table
 
     def write_batch(
         self,
-        rows: list[dict[str, Any]],
+        rows: Union["pa.RecordBatch", list[dict[str, Any]]],
         timestamp: Optional[datetime] = None,
     ) -> str:
-        """Write a batch of rows to S3 as Parquet.
+        """Append a batch of rows to the open Parquet file.
+
+        Opens a new file (and S3 upload) if none is open. Call flush() after
+        the last batch to complete the file.
 
         Args:
-            rows: List of row dictionaries to write.
-            timestamp: Optional timestamp for the file (uses current time if None).
+            rows: Record batch or list of row dictionaries to write.
+            timestamp: Optional timestamp for a newly opened file (uses the
+                execution start time if None).
 
         Returns:
-            The S3 key where the file was written.
+            The S3 key of a file completed by this batch, or "" if the file
+            is still open.
         """
         if not rows:
             logger.warning("Skipping empty batch")
             return ""
 
-        timestamp = timestamp or datetime.now(timezone.utc)
-        key = self._generate_key(timestamp)
+        import pyarrow as pa
 
         try:
-            # Convert to Arrow table
+            # Convert outside the lock so batches from other threads can encode
             table = self._convert_to_arrow(rows)
+        except Exception as e:
+            raise WriterError(f"Failed to convert batch: {e}") from e
 
-            # Write to buffer
-            buffer = io.BytesIO()
-            pq.write_table(
-                table,
-                buffer,
-                compression="snappy",
-                use_dictionary=True,
-            )
-            buffer.seek(0)
+        with self._file_lock:
+            completed = ""
+            try:
+                if self._parquet_writer is not None:
+                    schema = self._parquet_writer.schema
+                    if not table.schema.equals(schema):
+                        try:
+                            if not _castable_without_loss(table.schema, schema):
+                                raise ValueError("schema changed")
+                            table = table.cast(schema)
+                        except (ValueError, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                            # Incompatible schema; it gets a file of its own
+                            completed = self._close_file()
 
-            # Upload to S3
-            extra_args = {}
-            if self.s3_config.kms_key_id:
-                extra_args = {
-                    "ServerSideEncryption": "aws:kms",
-                    "SSEKMSKeyId": self.s3_config.kms_key_id,
-                }
+                parquet_writer, sink = self._parquet_writer, self._sink
+                if parquet_writer is None or sink is None:
+                    parquet_writer, sink = self._open_file(table, timestamp or self._run_timestamp)
 
-            self.s3.put_object(
-                Bucket=self.s3_config.bucket,
-                Key=key,
-                Body=buffer.getvalue(),
-                ContentType="application/octet-stream",
-                **extra_args,
-            )
+                parquet_writer.write_table(table)
+                self._file_rows += table.num_rows
 
-            logger.info(
-                "Wrote %d rows to s3://%s/%s",
-                len(rows),
-                self.s3_config.bucket,
-                key,
-            )
-            return key
+                if sink.tell() >= self.file_target_bytes:
+                    completed = self._close_file()
+                return completed
 
-        except Exception as e:
-            raise WriterError(f"Failed to write batch to S3: {e}") from e
+            except Exception as e:
+                self._abort_file()
+                raise WriterError(f"Failed to write batch to S3: {e}") from e
+
+    def flush(self) -> str:
+        """Complete the open file, if any.
+
+        Returns:
+            The S3 key of the completed file, or "" if no file was open.
+        """
+        with self._file_lock:
+            if self._parquet_writer is None:
+                return ""
+            try:
+                return self._close_file()
+            except Exception as e:
+                self._abort_file()
+                raise WriterError(f"Failed to write batch to S3: {e}") from e
+
+    def abort(self) -> None:
+        """Discard the open file, if any, without completing it."""
+        with self._file_lock:
+            self._abort_file()
+
+    def _open_file(
+        self, table: "pa.Table", timestamp: datetime
+    ) -> tuple["pq.ParquetWriter", _S3MultipartSink]:
+        """Start a new Parquet file for table's schema; caller holds the lock.
+
+        Returns:
+            The file's Parquet writer and the sink it encodes into.
+        """
+        import pyarrow.parquet as pq
+
+        extra_args = {}
+        if self.s3_config.kms_key_id:
+            extra_args = {
+                "ServerSideEncryption": "aws:kms",
+                "SSEKMSKeyId": self.s3_config.kms_key_id,
+            }
+
+        # Encode straight into S3; parts upload while encoding continues
+        self._sink = _S3MultipartSink(
+            self.s3,
+            self.s3_config.bucket,
+            self._generate_key(timestamp),
+            extra_args,
+            part_size=self.part_size,
+        )
+        self._parquet_writer = pq.ParquetWriter(
+            self._sink,
+            table.schema,
+            compression=self.s3_config.compression,
+            compression_level=self.s3_config.compression_level,
+            use_dictionary=True,
+            data_page_size=1 << 20,
+            write_statistics=True,
+            # Encode in step with the extractor's batches, not the first one's size
+            write_batch_size=min(self.table_config.batch_size, PARQUET_MAX_WRITE_BATCH_SIZE),
+            # Snowflake ignores the embedded Arrow schema; keep footers small
+            store_schema=False,
+            coerce_timestamps="us",
+        )
+        self._file_rows = 0
+        return self._parquet_writer, self._sink
+
+    def _close_file(self) -> str:
+        """Write the footer and complete the upload; caller holds the lock."""
+        parquet_writer, sink = self._parquet_writer, self._sink
+        self._parquet_writer = self._sink = None
+        if parquet_writer is None or sink is None:
+            return ""
+
+        try:
+            parquet_writer.close()
+            sink.close()
+        except Exception:
+            sink.abort()
+            raise
+
+        logger.info(
+            "Wrote %d rows to s3://%s/%s",
+            self._file_rows,
+            self.s3_config.bucket,
+            sink.key,
+        )
+        return sink.key
+
+    def _abort_file(self) -> None:
+        """Abort the open file's upload; caller holds the lock."""
+        parquet_writer, sink = self._parquet_writer, self._sink
+        self._parquet_writer = self._sink = None
+        if sink is None:
+            return
+
+        sink.abort()
+        if parquet_writer is None:
+            return
+        try:
+            # Release the writer; its footer write fails against the aborted sink
+            parquet_writer.close()
+        except Exception:
+            pass
 
     def get_written_files(self) -> int:
         """Get the number of files written so far."""
@@ -1,12 +1,12 @@
 """Pytest fixtures for CDC Lambda tests."""
 
-import os
 from datetime import datetime, timezone
+from types import MappingProxyType
 from unittest.mock import MagicMock, patch
 
 import pytest
 
-from src.config import AuroraConfig, LambdaConfig, S3Config, TableConfig
+from src.config import AuroraConfig, LambdaConfig, S3Config, TableConfig, _read_env
 
 
 @pytest.fixture
@@ -59,27 +59,59 @@ def lambda_config(aurora_config, table_config, s3_config):
     )
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_rows():
-    """Sample data rows."""
-    return [
-        {
-            "order_id": 1,
-            "customer_id": 100,
-            "status": "pending",
-            "updated_at": datetime(2024, 1, 15, 10, 0, 0, tzinfo=timezone.utc),
-            "commit_ts": datetime(2024, 1, 15, 10, 0, 0, tzinfo=timezone.utc),
-            "op": "I",
-        },
-        {
-            "order_id": 2,
-            "customer_id": 101,
-            "status": "shipped",
-            "updated_at": datetime(2024, 1, 15, 11, 0, 0, tzinfo=timezone.utc),
-            "commit_ts": datetime(2024, 1, 15, 11, 0, 0, tzinfo=timezone.utc),
-            "op": "U",
-        },
-    ]
+    """Sample data rows, shared read-only across the session."""
+    return (
+        MappingProxyType(
+            {
+                "order_id": 1,
+                "customer_id": 100,
+                "status": "pending",
+                "updated_at": datetime(2024, 1, 15, 10, 0, 0, tzinfo=timezone.utc),
+                "commit_ts": datetime(2024, 1, 15, 10, 0, 0, tzinfo=timezone.utc),
+                "op": "I",
+            }
+        ),
+        MappingProxyType(
+            {
+                "order_id": 2,
+                "customer_id": 101,
+                "status": "shipped",
+                "updated_at": datetime(2024, 1, 15, 11, 0, 0, tzinfo=timezone.utc),
+                "commit_ts": datetime(2024, 1, 15, 11, 0, 0, tzinfo=timezone.utc),
+                "op": "U",
+            }
+        ),
+    )
+
+
+@pytest.fixture(scope="session")
+def sample_columns():
+    """The sample rows in columnar form, as Arrow arrays keyed by column name."""
+    import pyarrow as pa
+
+    timestamp_type = pa.timestamp("us", tz="UTC")
+    return {
+        "order_id": pa.array([1, 2], type=pa.int64()),
+        "customer_id": pa.array([100, 101], type=pa.int64()),
+        "status": pa.array(["pending", "shipped"]),
+        "updated_at": pa.array(
+            [
+                datetime(2024, 1, 15, 10, 0, 0, tzinfo=timezone.utc),
+                datetime(2024, 1, 15, 11, 0, 0, tzinfo=timezone.utc),
+            ],
+            type=timestamp_type,
+        ),
+        "commit_ts": pa.array(
+            [
+                datetime(2024, 1, 15, 10, 0, 0, tzinfo=timezone.utc),
+                datetime(2024, 1, 15, 11, 0, 0, tzinfo=timezone.utc),
+            ],
+            type=timestamp_type,
+        ),
+        "op": pa.array(["I", "U"]),
+    }
 
 
 @pytest.fixture
@@ -99,8 +131,8 @@ def mock_s3():
 
 
 @pytest.fixture
-def env_vars():
-    """Set required environment variables."""
+def env_vars(monkeypatch):
+    """Set required environment variables for the current test only."""
     env = {
         "AURORA_HOST": "test-aurora.cluster.us-east-1.rds.amazonaws.com",
         "AURORA_PORT": "5432",
@@ -114,5 +146,8 @@ def env_vars():
         "S3_PREFIX": "cdc",
         "DYNAMODB_TABLE": "test-watermarks",
     }
-    with patch.dict(os.environ, env):
-        yield env
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    _read_env.cache_clear()
+    yield env
+    _read_env.cache_clear()
@@ -1,11 +1,13 @@
 """Tests for data extraction."""
 
 from datetime import datetime, timezone
+from decimal import Decimal
 from unittest.mock import MagicMock, patch
 
 import pytest
 
-from src.config import AuroraConfig, TableConfig
+from src.config import AuroraConfig, LambdaConfig, TableConfig
+from src.exceptions import ConfigurationError, ExtractionError
 from src.extractor import DataExtractor
 
 
@@ -17,6 +19,21 @@ class TestDataExtractor:
         """Create a DataExtractor with mock connection."""
         return DataExtractor(aurora_config, table_config)
 
+    @pytest.fixture
+    def serve_pages(self, extractor, monkeypatch):
+        """Return a helper that makes the extractor's cursor serve the given pages."""
+
+        def serve(description, pages):
+            mock_cursor = MagicMock()
+            mock_cursor.description = description
+            mock_cursor.fetchmany.side_effect = [*pages, []]
+            mock_conn = MagicMock()
+            mock_conn.cursor.return_value = mock_cursor
+            monkeypatch.setattr("src.extractor.get_connection", lambda *args, **kwargs: mock_conn)
+            extractor._avg_row_bytes = 0
+
+        return serve
+
     def test_build_query_full_load(self, extractor):
         """Test query building for full load."""
         query, params = extractor.build_query(watermark=None)
@@ -83,6 +100,96 @@ class TestDataExtractor:
 
         assert count == 50
 
+    def test_extract_batches_yields_record_batches(self, serve_pages, extractor):
+        """Test that cursor tuples are transposed into Arrow record batches."""
+        import pyarrow as pa
+
+        ts1 = datetime(2024, 1, 15, 10, 0, 0, tzinfo=timezone.utc)
+        ts2 = datetime(2024, 1, 15, 11, 0, 0, tzinfo=timezone.utc)
+        serve_pages(
+            [("order_id",), ("status",), ("commit_ts",), ("op",)],
+            [[(1, "pending", ts1, "I"), (2, "shipped", ts2, "U")], [(3, "pending", ts2, "U")]],
+        )
+
+        batches = list(extractor.extract_batches(watermark=None, batch_size=2))
+
+        assert [b.num_rows for b, _ in batches] == [2, 1]
+        assert all(isinstance(b, pa.RecordBatch) for b, _ in batches)
+        assert batches[0][0].schema.names == ["order_id", "status", "commit_ts", "op"]
+        assert batches[0][1] == ts2
+        assert batches[1][1] == ts2
+
+    def test_extract_batches_skips_null_watermarks(self, serve_pages, extractor):
+        """Test that trailing NULL watermarks do not reset the batch max."""
+        ts1 = datetime(2024, 1, 15, 10, 0, 0, tzinfo=timezone.utc)
+        serve_pages([("order_id",), ("commit_ts",), ("op",)], [[(1, ts1, "I"), (2, None, "I")]])
+
+        batches = list(extractor.extract_batches(watermark=None))
+
+        assert batches[0][1] == ts1
+
+    def test_extract_batches_numeric_nan_loaded_as_null(self, serve_pages, extractor):
+        """Test that NUMERIC NaN, which Arrow decimals cannot hold, becomes NULL."""
+        serve_pages(
+            [("order_id",), ("amount",), ("commit_ts",)],
+            [[(1, Decimal("9.99"), None), (2, Decimal("NaN"), None)]],
+        )
+
+        batches = list(extractor.extract_batches(watermark=None))
+
+        assert batches[0][0].column(1).to_pylist() == [Decimal("9.99"), None]
+
+    def test_extract_batches_numeric_keeps_declared_type(self, serve_pages, extractor):
+        """Test that NUMERIC(p, s) columns keep one decimal type whatever the magnitudes."""
+        import pyarrow as pa
+
+        serve_pages(
+            [("order_id",), ("amount", 1700, None, None, 10, 2, None), ("commit_ts",)],
+            [
+                [(1, Decimal("1.50"), None)],
+                [(2, Decimal("100.25"), None)],
+                [(3, Decimal("3.1"), None)],
+            ],
+        )
+
+        batches = [batch for batch, _ in extractor.extract_batches(watermark=None, batch_size=1)]
+
+        assert {batch.schema.field("amount").type for batch in batches} == {pa.decimal128(10, 2)}
+        assert [batch.column(1)[0].as_py() for batch in batches] == [
+            Decimal("1.50"),
+            Decimal("100.25"),
+            Decimal("3.10"),
+        ]
+
+    def test_extract_batches_unconvertible_column(self, serve_pages, extractor):
+        """Test that a column Arrow cannot convert raises ExtractionError naming it."""
+        serve_pages(
+            [("order_id",), ("status",), ("commit_ts",)], [[(1, "pending", None), (2, 5, None)]]
+        )
+
+        with pytest.raises(ExtractionError, match="status"):
+            list(extractor.extract_batches(watermark=None))
+
+    @patch("src.extractor.get_connection")
+    def test_fetch_size_capped_for_wide_rows(self, mock_get_conn, extractor):
+        """Test that wide rows shrink the batch to fit the memory budget."""
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_cursor.fetchone.return_value = (8192,)
+        mock_conn.cursor.return_value.__enter__ = MagicMock(return_value=mock_cursor)
+        mock_conn.cursor.return_value.__exit__ = MagicMock(return_value=False)
+        mock_get_conn.return_value = mock_conn
+
+        assert extractor.fetch_size(10000) == 2048
+        assert extractor.fetch_size(500) == 500
+        mock_cursor.execute.assert_called_once()
+
+    def test_fetch_size_unknown_row_width(self, extractor):
+        """Test that the requested batch size is kept when width is unknown."""
+        extractor._avg_row_bytes = 0
+
+        assert extractor.fetch_size(10000) == 10000
+
 
 class TestTableConfig:
     """Tests for TableConfig."""
@@ -101,3 +208,49 @@ class TestTableConfig:
             watermark_column="updated_at",
         )
         assert config.batch_size == 10000
+
+    def test_rejects_unsafe_identifier(self):
+        """Test that identifiers interpolated into SQL are validated."""
+        with pytest.raises(ConfigurationError):
+            TableConfig(
+                table_name="TEST",
+                source_schema="public",
+                source_table="test; DROP TABLE test",
+                source_columns=["id"],
+                watermark_column="updated_at",
+            )
+
+
+class TestLambdaConfig:
+    """Tests for LambdaConfig."""
+
+    def test_from_env(self, env_vars):
+        """Test building config from environment variables."""
+        config = LambdaConfig.from_env()
+
+        assert config.aurora.port == 5432
+        assert config.table.source_columns == ["order_id", "customer_id", "status", "updated_at"]
+        assert config.table.table_name == "ORDERS_CDC"
+        assert config.dry_run is False
+        assert config.s3.compression == "zstd"
+        assert config.s3.compression_level == 1
+
+    def test_from_env_snappy_has_no_level(self, env_vars, monkeypatch):
+        """Test that codecs without levels do not inherit the zstd default."""
+        monkeypatch.setenv("PARQUET_COMPRESSION", "snappy")
+
+        config = LambdaConfig.from_env()
+
+        assert config.s3.compression == "snappy"
+        assert config.s3.compression_level is None
+
+    def test_from_env_returns_independent_copies(self, env_vars):
+        """Test that cached env parsing never shares mutable config objects."""
+        first = LambdaConfig.from_env()
+        first.table.batch_size = 1
+        first.aurora.username = "someone"
+
+        second = LambdaConfig.from_env()
+
+        assert second.table.batch_size == 10000
+        assert second.aurora.username == ""
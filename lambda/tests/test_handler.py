@@ -1,12 +1,98 @@
 """Tests for Lambda handler."""
 
+import itertools
+import logging
 from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Optional
 from unittest.mock import MagicMock, patch
 
 import pytest
 
-from src.exceptions import ConfigurationError
-from src.handler import check_timeout, handler
+from src import handler as handler_module
+from src.exceptions import ConcurrentModificationError, ConfigurationError, WriterError
+from src.handler import check_timeout, commit_watermark, get_aurora_secret, handler
+
+WATERMARK = datetime(2024, 1, 15, 10, 0, 0, tzinfo=timezone.utc)
+BATCH_WATERMARK = datetime(2024, 1, 15, 11, 0, 0, tzinfo=timezone.utc)
+# Batch watermarks for the timeout test, built once at import
+TIMEOUT_WATERMARKS = tuple(
+    datetime(2024, 1, 15, 10 + i, 0, 0, tzinfo=timezone.utc) for i in range(10)
+)
+
+
+class StubWatermarkManager:
+    """WatermarkManager stand-in that returns a fixed watermark and records updates.
+
+    Setting conflict_watermark makes every update fail its optimistic lock,
+    with consistent reads returning that watermark instead.
+    """
+
+    def __init__(
+        self,
+        watermark: Optional[datetime] = None,
+        conflict_watermark: Optional[datetime] = None,
+    ):
+        self.watermark = watermark
+        self.conflict_watermark = conflict_watermark
+        self.reads: list[str] = []
+        self.updates: list[dict[str, Any]] = []
+
+    def get_watermark(self, table_name: str, consistent_read: bool = False) -> Optional[datetime]:
+        self.reads.append(table_name)
+        if consistent_read and self.conflict_watermark is not None:
+            return self.conflict_watermark
+        return self.watermark
+
+    def update_watermark(self, **kwargs: Any) -> None:
+        if self.conflict_watermark is not None:
+            raise ConcurrentModificationError("watermark moved")
+        self.updates.append(kwargs)
+
+
+class StubExtractor:
+    """DataExtractor stand-in that serves preset batches."""
+
+    def __init__(self, row_count: int = 0, batches: tuple = ()):
+        self.row_count = row_count
+        self.batches = batches
+        self.count_calls: list[Optional[datetime]] = []
+
+    def refresh(self, aurora_config, table_config) -> None:
+        pass
+
+    def get_row_count(self, watermark: Optional[datetime] = None) -> int:
+        self.count_calls.append(watermark)
+        return self.row_count
+
+    def extract_batches(self, watermark: Optional[datetime], batch_size: Optional[int] = None):
+        yield from self.batches
+
+
+class StubWriter:
+    """S3ParquetWriter stand-in that records written batches."""
+
+    def __init__(self, error: Optional[Exception] = None):
+        self.error = error
+        self.written: list = []
+        self.flushes = 0
+        self.aborts = 0
+
+    def write_batch(self, rows, timestamp: Optional[datetime] = None) -> str:
+        if self.error:
+            raise self.error
+        self.written.append(rows)
+        return ""
+
+    def flush(self) -> str:
+        self.flushes += 1
+        return "key"
+
+    def abort(self) -> None:
+        self.aborts += 1
+
+    def get_written_files(self) -> int:
+        return len(self.written)
 
 
 class TestCheckTimeout:
@@ -31,190 +117,313 @@ class TestCheckTimeout:
         assert check_timeout(None, 60) is False
 
 
-class TestHandler:
-    """Tests for main handler."""
+class TestLogLevel:
+    """Tests for LOG_LEVEL parsing."""
 
-    @patch("src.handler.build_config")
-    @patch("src.handler.WatermarkManager")
-    @patch("src.handler.DataExtractor")
-    @patch("src.handler.S3ParquetWriter")
-    def test_handler_no_rows(
-        self, mock_writer_cls, mock_extractor_cls, mock_wm_cls, mock_build_config, lambda_config
-    ):
-        """Test handler when no rows to export."""
-        mock_build_config.return_value = lambda_config
+    def test_known_level(self):
+        """Test that level names are accepted in any case."""
+        assert handler_module._log_level("debug") == logging.DEBUG
 
-        mock_wm = MagicMock()
-        mock_wm.get_watermark.return_value = datetime(2024, 1, 15, 10, 0, 0, tzinfo=timezone.utc)
-        mock_wm_cls.return_value = mock_wm
+    def test_unknown_level_falls_back_to_info(self):
+        """Test that an unknown level logs at INFO instead of failing the import."""
+        assert handler_module._log_level("verbose") == logging.INFO
 
-        mock_extractor = MagicMock()
-        mock_extractor.get_row_count.return_value = 0
-        mock_extractor_cls.return_value = mock_extractor
 
-        result = handler({"table_name": "ORDERS_CDC"}, None)
+class TestGetAuroraSecret:
+    """Tests for Secrets Manager caching."""
 
-        assert result["statusCode"] == 200
-        assert result["body"]["rows_exported"] == 0
-        assert "No new rows" in result["body"]["message"]
-
-    @patch("src.handler.build_config")
-    @patch("src.handler.WatermarkManager")
-    @patch("src.handler.DataExtractor")
-    @patch("src.handler.S3ParquetWriter")
-    def test_handler_with_rows(
-        self,
-        mock_writer_cls,
-        mock_extractor_cls,
-        mock_wm_cls,
-        mock_build_config,
-        lambda_config,
-        sample_rows,
-    ):
-        """Test handler with data to export."""
-        mock_build_config.return_value = lambda_config
+    @pytest.fixture(autouse=True)
+    def reset_cache(self, monkeypatch):
+        """Start every test with an empty secret cache."""
+        monkeypatch.setattr(handler_module, "_cached_secret", None)
+        monkeypatch.setattr(handler_module, "_cached_secret_at", 0.0)
+        monkeypatch.setattr(handler_module, "_secrets_client", None)
 
-        mock_wm = MagicMock()
-        mock_wm.get_watermark.return_value = datetime(2024, 1, 15, 10, 0, 0, tzinfo=timezone.utc)
-        mock_wm_cls.return_value = mock_wm
+    @patch("src.handler.boto3.client")
+    def test_secret_cached_within_ttl(self, mock_client_factory):
+        """Test that warm calls reuse the cached secret."""
+        client = MagicMock()
+        client.get_secret_value.return_value = {
+            "SecretString": '{"username": "u", "password": "p"}'
+        }
+        mock_client_factory.return_value = client
 
-        mock_extractor = MagicMock()
-        mock_extractor.get_row_count.return_value = 2
-        mock_extractor.extract_batches.return_value = iter(
-            [(sample_rows, datetime(2024, 1, 15, 11, 0, 0, tzinfo=timezone.utc))]
-        )
-        mock_extractor_cls.return_value = mock_extractor
+        first = get_aurora_secret("arn:test")
+        second = get_aurora_secret("arn:test")
 
-        mock_writer = MagicMock()
-        mock_writer.get_written_files.return_value = 1
-        mock_writer_cls.return_value = mock_writer
+        assert first == second == {"username": "u", "password": "p"}
+        client.get_secret_value.assert_called_once()
 
-        result = handler({"table_name": "ORDERS_CDC"}, None)
+    @patch("src.handler.boto3.client")
+    def test_secret_refreshed_after_ttl(self, mock_client_factory, monkeypatch):
+        """Test that an expired cache entry is refetched."""
+        monkeypatch.setenv("SECRET_CACHE_TTL_SECONDS", "0")
+        client = MagicMock()
+        client.get_secret_value.return_value = {
+            "SecretString": '{"username": "u", "password": "p"}'
+        }
+        mock_client_factory.return_value = client
 
-        assert result["statusCode"] == 200
-        assert result["body"]["rows_exported"] == 2
-        assert result["body"]["files_written"] == 1
-        mock_wm.update_watermark.assert_called_once()
+        get_aurora_secret("arn:test")
+        get_aurora_secret("arn:test")
 
-    @patch("src.handler.build_config")
-    @patch("src.handler.WatermarkManager")
-    @patch("src.handler.DataExtractor")
-    @patch("src.handler.S3ParquetWriter")
-    def test_handler_force_full_load(
-        self, mock_writer_cls, mock_extractor_cls, mock_wm_cls, mock_build_config, lambda_config
-    ):
-        """Test handler with force full load."""
-        mock_build_config.return_value = lambda_config
+        assert client.get_secret_value.call_count == 2
+        mock_client_factory.assert_called_once_with("secretsmanager")
 
-        mock_wm = MagicMock()
-        mock_wm_cls.return_value = mock_wm
 
-        mock_extractor = MagicMock()
-        mock_extractor.get_row_count.return_value = 0
-        mock_extractor_cls.return_value = mock_extractor
+class TestGetExtractor:
+    """Tests for warm-start extractor reuse."""
 
-        handler({"table_name": "ORDERS_CDC", "force_full_load": True}, None)
+    def test_extractor_reused_and_refreshed(self, lambda_config, monkeypatch):
+        """Test that a warm invocation reuses the extractor with fresh config."""
+        monkeypatch.setattr(handler_module, "_extractor_cache", {})
 
-        # Should not call get_watermark when force_full_load is True
-        # Actually it still gets it but ignores it
-        mock_extractor.get_row_count.assert_called_with(None)
+        first = handler_module.get_extractor(lambda_config)
+        first._conn = MagicMock()
+        lambda_config.table.batch_size = 50
+        second = handler_module.get_extractor(lambda_config)
 
-    @patch("src.handler.build_config")
-    @patch("src.handler.WatermarkManager")
-    @patch("src.handler.DataExtractor")
-    @patch("src.handler.S3ParquetWriter")
-    def test_handler_dry_run(
-        self,
-        mock_writer_cls,
-        mock_extractor_cls,
-        mock_wm_cls,
-        mock_build_config,
-        lambda_config,
-        sample_rows,
-    ):
-        """Test handler in dry run mode."""
-        lambda_config.dry_run = True
-        mock_build_config.return_value = lambda_config
+        assert second is first
+        assert second.table_config.batch_size == 50
+        assert second._conn is None
+
+
+class TestCommitWatermark:
+    """Tests for commit_watermark conflict handling."""
 
+    PREV_WM = datetime(2024, 1, 15, 10, 0, 0, tzinfo=timezone.utc)
+    NEW_WM = datetime(2024, 1, 15, 12, 0, 0, tzinfo=timezone.utc)
+
+    def test_retries_after_stale_read(self):
+        """Test that a conflict inside the exported window is retried once."""
+        stored_wm = datetime(2024, 1, 15, 11, 0, 0, tzinfo=timezone.utc)
         mock_wm = MagicMock()
-        mock_wm.get_watermark.return_value = None
-        mock_wm_cls.return_value = mock_wm
+        mock_wm.update_watermark.side_effect = [ConcurrentModificationError("conflict"), None]
+        mock_wm.get_watermark.return_value = stored_wm
 
-        mock_extractor = MagicMock()
-        mock_extractor.get_row_count.return_value = 2
-        mock_extractor.extract_batches.return_value = iter(
-            [(sample_rows, datetime(2024, 1, 15, 11, 0, 0, tzinfo=timezone.utc))]
-        )
-        mock_extractor_cls.return_value = mock_extractor
+        assert commit_watermark(mock_wm, "ORDERS_CDC", self.NEW_WM, self.PREV_WM, rows_exported=2)
 
-        mock_writer = MagicMock()
-        mock_writer.get_written_files.return_value = 0
-        mock_writer_cls.return_value = mock_writer
+        mock_wm.get_watermark.assert_called_once_with("ORDERS_CDC", consistent_read=True)
+        assert mock_wm.update_watermark.call_count == 2
+        assert mock_wm.update_watermark.call_args.kwargs["previous_watermark"] == stored_wm
 
-        result = handler({"table_name": "ORDERS_CDC", "dry_run": True}, None)
+    def test_abandons_when_watermark_already_ahead(self):
+        """Test that a watermark already past this run's window is left alone."""
+        mock_wm = MagicMock()
+        mock_wm.update_watermark.side_effect = ConcurrentModificationError("conflict")
+        mock_wm.get_watermark.return_value = datetime(2024, 1, 15, 13, 0, 0, tzinfo=timezone.utc)
 
-        assert result["body"]["dry_run"] is True
-        mock_writer.write_batch.assert_not_called()
-        mock_wm.update_watermark.assert_not_called()
+        assert not commit_watermark(
+            mock_wm, "ORDERS_CDC", self.NEW_WM, self.PREV_WM, rows_exported=2
+        )
 
-    def test_handler_missing_table_name(self):
-        """Test handler with missing table_name."""
-        with pytest.raises(ConfigurationError) as exc_info:
-            handler({}, None)
+        mock_wm.update_watermark.assert_called_once()
 
-        assert "table_name is required" in str(exc_info.value)
 
-    @patch("src.handler.build_config")
-    @patch("src.handler.WatermarkManager")
-    @patch("src.handler.DataExtractor")
-    @patch("src.handler.S3ParquetWriter")
-    def test_handler_timeout_handling(
+class TestHandler:
+    """Tests for main handler."""
+
+    @pytest.fixture(autouse=True)
+    def stubs(self, monkeypatch, lambda_config):
+        """Install stub components and config for every handler test."""
+        stubs = SimpleNamespace(
+            config=lambda_config,
+            watermark_mgr=StubWatermarkManager(),
+            extractor=StubExtractor(),
+            writer=StubWriter(),
+        )
+        monkeypatch.setattr(handler_module, "_extractor_cache", {})
+        monkeypatch.setattr(handler_module, "build_config", lambda event: stubs.config)
+        monkeypatch.setattr(
+            handler_module, "WatermarkManager", lambda *args, **kwargs: stubs.watermark_mgr
+        )
+        monkeypatch.setattr(
+            handler_module, "DataExtractor", lambda *args, **kwargs: stubs.extractor
+        )
+        monkeypatch.setattr(handler_module, "S3ParquetWriter", lambda *args, **kwargs: stubs.writer)
+        return stubs
+
+    @pytest.fixture
+    def sample_batch(self, sample_columns):
+        """The sample rows as the record batch the extractor yields."""
+        import pyarrow as pa
+
+        return pa.RecordBatch.from_pydict(sample_columns)
+
+    @pytest.fixture
+    def one_batch(self, sample_batch):
+        """A single extracted batch."""
+        return ((sample_batch, BATCH_WATERMARK),)
+
+    @pytest.fixture
+    def timeout_batches(self, sample_batch):
+        """Ten extracted batches, more than the timeout test lets through."""
+        return tuple((sample_batch, watermark) for watermark in TIMEOUT_WATERMARKS)
+
+    @pytest.mark.parametrize(
+        (
+            "event",
+            "watermark",
+            "row_count",
+            "batches",
+            "timeout",
+            "expected",
+            "count_calls",
+            "updates",
+        ),
+        [
+            pytest.param(
+                {},
+                WATERMARK,
+                0,
+                None,
+                False,
+                {"rows_exported": 0, "message": "No new rows to export"},
+                [WATERMARK],
+                0,
+                id="no_rows",
+            ),
+            pytest.param(
+                {},
+                WATERMARK,
+                2,
+                "one_batch",
+                False,
+                {
+                    "rows_exported": 2,
+                    "files_written": 1,
+                    "timeout_reached": False,
+                    "watermark_updated": True,
+                },
+                [WATERMARK],
+                1,
+                id="with_rows",
+            ),
+            pytest.param(
+                {"force_full_load": True},
+                WATERMARK,
+                0,
+                None,
+                False,
+                {"rows_exported": 0},
+                [None],
+                0,
+                id="force_full_load",
+            ),
+            pytest.param(
+                {"dry_run": True},
+                None,
+                2,
+                "one_batch",
+                False,
+                {"rows_exported": 2, "files_written": 0, "dry_run": True},
+                [None],
+                0,
+                id="dry_run",
+            ),
+            pytest.param(
+                {"skip_count": True},
+                WATERMARK,
+                0,
+                None,
+                False,
+                {"rows_exported": 0, "message": "No new rows to export"},
+                [],
+                0,
+                id="skip_count",
+            ),
+            pytest.param(
+                {},
+                None,
+                1000,
+                "timeout_batches",
+                True,
+                {
+                    "rows_exported": 2,
+                    "timeout_reached": True,
+                    "message": "Partial export due to timeout",
+                },
+                [None],
+                1,
+                id="timeout",
+            ),
+        ],
+    )
+    def test_handler_scenarios(
         self,
-        mock_writer_cls,
-        mock_extractor_cls,
-        mock_wm_cls,
-        mock_build_config,
-        lambda_config,
-        sample_rows,
+        request,
+        stubs,
+        event,
+        watermark,
+        row_count,
+        batches,
+        timeout,
+        expected,
+        count_calls,
+        updates,
     ):
-        """Test handler graceful timeout handling."""
-        mock_build_config.return_value = lambda_config
+        """Test handler results across export scenarios."""
+        stubs.config.dry_run = event.get("dry_run", False)
+        stubs.watermark_mgr.watermark = watermark
+        stubs.extractor.row_count = row_count
+        if batches:
+            stubs.extractor.batches = request.getfixturevalue(batches)
 
-        mock_wm = MagicMock()
-        mock_wm.get_watermark.return_value = None
-        mock_wm_cls.return_value = mock_wm
+        context = None
+        if timeout:
+            # Five minutes left for the first batch, then 30 seconds (inside the buffer)
+            remaining = itertools.chain([300000], itertools.repeat(30000))
+            context = SimpleNamespace(get_remaining_time_in_millis=lambda: next(remaining))
 
-        mock_extractor = MagicMock()
-        mock_extractor.get_row_count.return_value = 1000
+        result = handler({"table_name": "ORDERS_CDC", **event}, context)
 
-        # Return multiple batches
-        def gen_batches():
-            for i in range(10):
-                yield (
-                    sample_rows,
-                    datetime(2024, 1, 15, 10 + i, 0, 0, tzinfo=timezone.utc),
-                )
+        assert result["statusCode"] == 200
+        for key, value in expected.items():
+            assert result["body"][key] == value
+        assert stubs.extractor.count_calls == count_calls
+        assert len(stubs.watermark_mgr.updates) == updates
 
-        mock_extractor.extract_batches.return_value = gen_batches()
-        mock_extractor_cls.return_value = mock_extractor
+    def test_handler_force_full_load_skips_watermark_read(self, stubs):
+        """Test that a forced full load never reads the stored watermark."""
+        stubs.watermark_mgr.watermark = WATERMARK
 
-        mock_writer = MagicMock()
-        mock_writer.get_written_files.return_value = 1
-        mock_writer_cls.return_value = mock_writer
+        handler({"table_name": "ORDERS_CDC", "force_full_load": True}, None)
 
-        # Create a context that will trigger timeout after first batch
-        context = MagicMock()
-        call_count = [0]
+        assert stubs.watermark_mgr.reads == []
+        assert stubs.extractor.count_calls == [None]
 
-        def remaining_time():
-            call_count[0] += 1
-            if call_count[0] > 1:
-                return 30000  # 30 seconds - triggers timeout
-            return 300000  # 5 minutes
+    def test_handler_reports_abandoned_watermark(self, stubs, one_batch):
+        """Test that a watermark another run moved past this export is reported, not raised."""
+        stubs.watermark_mgr.watermark = WATERMARK
+        stubs.watermark_mgr.conflict_watermark = datetime(
+            2024, 1, 15, 13, 0, 0, tzinfo=timezone.utc
+        )
+        stubs.extractor.row_count = 2
+        stubs.extractor.batches = one_batch
 
-        context.get_remaining_time_in_millis = remaining_time
+        result = handler({"table_name": "ORDERS_CDC"}, None)
 
-        result = handler({"table_name": "ORDERS_CDC"}, context)
+        assert result["statusCode"] == 200
+        assert result["body"]["rows_exported"] == 2
+        assert result["body"]["watermark_updated"] is False
+        assert stubs.watermark_mgr.updates == []
 
-        assert result["body"]["timeout_reached"] is True
-        assert "Partial export" in result["body"]["message"]
+    def test_handler_write_failure_keeps_watermark(self, stubs, one_batch):
+        """Test that a failed background upload stops the watermark update."""
+        stubs.extractor.row_count = 2
+        stubs.extractor.batches = one_batch
+        stubs.writer.error = WriterError("upload failed")
+
+        with pytest.raises(WriterError):
+            handler({"table_name": "ORDERS_CDC"}, None)
+
+        assert stubs.writer.flushes == 0
+        assert stubs.writer.aborts == 1
+        assert stubs.watermark_mgr.updates == []
+
+    def test_handler_missing_table_name(self):
+        """Test handler with missing table_name."""
+        with pytest.raises(ConfigurationError) as exc_info:
+            handler({}, None)
+
+        assert "table_name is required" in str(exc_info.value)
@@ -6,135 +6,292 @@ from unittest.mock import MagicMock
 import pytest
 from botocore.exceptions import ClientError
 
-from src.exceptions import WatermarkError
+from src import watermark as watermark_module
+from src.exceptions import ConcurrentModificationError, WatermarkError
 from src.watermark import WatermarkManager
 
+# DynamoDB client operations WatermarkManager uses; anything else is a test bug
+DYNAMODB_CLIENT_SPEC = ["get_item", "batch_get_item", "update_item"]
 
-class TestWatermarkManager:
-    """Tests for WatermarkManager."""
+# Watermarks and their stored attribute values, built once at import
+OLD_WATERMARK = datetime(2024, 1, 15, 10, 0, 0, tzinfo=timezone.utc)
+MID_WATERMARK = datetime(2024, 1, 15, 11, 0, 0, tzinfo=timezone.utc)
+NEW_WATERMARK = datetime(2024, 1, 15, 12, 0, 0, tzinfo=timezone.utc)
+OLD_WATERMARK_ATTR = {"S": OLD_WATERMARK.isoformat()}
+MID_WATERMARK_ATTR = {"S": MID_WATERMARK.isoformat()}
+GET_ITEM_RESPONSE = {
+    "Item": {
+        "table_name": {"S": "ORDERS_CDC"},
+        "watermark": OLD_WATERMARK_ATTR,
+        "rows_exported": {"N": "1000"},
+    }
+}
 
-    def test_get_watermark_exists(self):
-        """Test getting an existing watermark."""
-        mock_client = MagicMock()
-        mock_client.get_item.return_value = {
-            "Item": {
-                "table_name": {"S": "ORDERS_CDC"},
-                "watermark": {"S": "2024-01-15T10:00:00+00:00"},
-                "rows_exported": {"N": "1000"},
-            }
+
+@pytest.fixture(scope="module")
+def mock_client():
+    """DynamoDB client mock limited to the operations WatermarkManager calls.
+
+    Built once per module; reset_mock_client clears it between tests.
+    """
+    return MagicMock(spec=DYNAMODB_CLIENT_SPEC)
+
+
+@pytest.fixture(autouse=True)
+def reset_mock_client(mock_client):
+    """Clear calls, return values and side effects left by the previous test."""
+    mock_client.reset_mock(return_value=True, side_effect=True)
+
+
+def test_get_watermark_exists(mock_client):
+    """Test getting an existing watermark."""
+    mock_client.get_item.return_value = GET_ITEM_RESPONSE
+
+    manager = WatermarkManager("test-table", mock_client)
+    result = manager.get_watermark("ORDERS_CDC")
+
+    assert result == OLD_WATERMARK
+    mock_client.get_item.assert_called_once()
+    assert mock_client.get_item.call_args.kwargs["ConsistentRead"] is False
+
+
+def test_get_watermark_zulu_suffix(mock_client):
+    """Test that watermarks stored with a trailing Z parse as UTC."""
+    mock_client.get_item.return_value = {
+        "Item": {
+            "table_name": {"S": "ORDERS_CDC"},
+            "watermark": {"S": "2024-01-15T10:00:00Z"},
         }
+    }
 
-        manager = WatermarkManager("test-table", mock_client)
-        result = manager.get_watermark("ORDERS_CDC")
+    manager = WatermarkManager("test-table", mock_client)
 
-        assert result == datetime(2024, 1, 15, 10, 0, 0, tzinfo=timezone.utc)
-        mock_client.get_item.assert_called_once()
+    assert manager.get_watermark("ORDERS_CDC") == OLD_WATERMARK
 
-    def test_get_watermark_not_exists(self):
-        """Test getting watermark when none exists."""
-        mock_client = MagicMock()
-        mock_client.get_item.return_value = {}
 
-        manager = WatermarkManager("test-table", mock_client)
-        result = manager.get_watermark("NEW_TABLE")
+def test_get_watermark_not_exists(mock_client):
+    """Test getting watermark when none exists."""
+    mock_client.get_item.return_value = {}
 
-        assert result is None
+    manager = WatermarkManager("test-table", mock_client)
+    result = manager.get_watermark("NEW_TABLE")
 
-    def test_get_watermark_error(self):
-        """Test error handling when getting watermark."""
-        mock_client = MagicMock()
-        mock_client.get_item.side_effect = ClientError(
-            {"Error": {"Code": "InternalError", "Message": "Test error"}},
-            "GetItem",
-        )
+    assert result is None
 
-        manager = WatermarkManager("test-table", mock_client)
 
-        with pytest.raises(WatermarkError):
-            manager.get_watermark("ORDERS_CDC")
+def test_get_watermark_error(mock_client):
+    """Test error handling when getting watermark."""
+    mock_client.get_item.side_effect = ClientError(
+        {"Error": {"Code": "InternalError", "Message": "Test error"}},
+        "GetItem",
+    )
 
-    def test_update_watermark_first_run(self):
-        """Test updating watermark on first run."""
-        mock_client = MagicMock()
+    manager = WatermarkManager("test-table", mock_client)
 
-        manager = WatermarkManager("test-table", mock_client)
-        new_wm = datetime(2024, 1, 15, 12, 0, 0, tzinfo=timezone.utc)
+    with pytest.raises(WatermarkError):
+        manager.get_watermark("ORDERS_CDC")
 
-        manager.update_watermark(
-            table_name="ORDERS_CDC",
-            new_watermark=new_wm,
-            rows_exported=500,
-            execution_id="abc123",
-            duration_seconds=30.5,
-            previous_watermark=None,
-        )
 
-        mock_client.put_item.assert_called_once()
-        call_args = mock_client.put_item.call_args
-        assert call_args.kwargs["ConditionExpression"] == "attribute_not_exists(table_name)"
+def test_get_watermarks_batched(mock_client):
+    """Test that several watermarks are read with a single BatchGetItem."""
+    mock_client.batch_get_item.return_value = {
+        "Responses": {
+            "test-table": [
+                {
+                    "table_name": {"S": "ORDERS_CDC"},
+                    "watermark": OLD_WATERMARK_ATTR,
+                },
+                {
+                    "table_name": {"S": "CUSTOMERS_CDC"},
+                    "watermark": MID_WATERMARK_ATTR,
+                },
+            ]
+        },
+        "UnprocessedKeys": {},
+    }
+
+    manager = WatermarkManager("test-table", mock_client)
+    result = manager.get_watermarks(["ORDERS_CDC", "CUSTOMERS_CDC", "NEW_CDC"])
+
+    assert mock_client.batch_get_item.call_count == 1
+    keys = mock_client.batch_get_item.call_args.kwargs["RequestItems"]["test-table"]["Keys"]
+    assert len(keys) == 3
+    assert result == {
+        "ORDERS_CDC": OLD_WATERMARK,
+        "CUSTOMERS_CDC": MID_WATERMARK,
+        "NEW_CDC": None,
+    }
+
+
+def test_get_watermarks_retries_unprocessed_keys(mock_client, monkeypatch):
+    """Test that unprocessed keys are requested again after a backoff."""
+    sleeps: list[float] = []
+    monkeypatch.setattr(watermark_module.time, "sleep", sleeps.append)
+    unprocessed = {"test-table": {"Keys": [{"table_name": {"S": "CUSTOMERS_CDC"}}]}}
+    mock_client.batch_get_item.side_effect = [
+        {
+            "Responses": {
+                "test-table": [{"table_name": {"S": "ORDERS_CDC"}, "watermark": OLD_WATERMARK_ATTR}]
+            },
+            "UnprocessedKeys": unprocessed,
+        },
+        {
+            "Responses": {
+                "test-table": [
+                    {"table_name": {"S": "CUSTOMERS_CDC"}, "watermark": MID_WATERMARK_ATTR}
+                ]
+            },
+            "UnprocessedKeys": {},
+        },
+    ]
+
+    manager = WatermarkManager("test-table", mock_client)
+    result = manager.get_watermarks(["ORDERS_CDC", "CUSTOMERS_CDC"])
+
+    assert result == {"ORDERS_CDC": OLD_WATERMARK, "CUSTOMERS_CDC": MID_WATERMARK}
+    assert mock_client.batch_get_item.call_args.kwargs["RequestItems"] == unprocessed
+    assert sleeps == [watermark_module.BATCH_GET_BACKOFF_SECONDS]
+
 
-    def test_update_watermark_subsequent_run(self):
-        """Test updating watermark with optimistic locking."""
-        mock_client = MagicMock()
+def test_get_watermarks_gives_up_on_unprocessed_keys(mock_client, monkeypatch):
+    """Test that keys still unprocessed at the attempt cap raise WatermarkError."""
+    monkeypatch.setattr(watermark_module.time, "sleep", lambda seconds: None)
+    mock_client.batch_get_item.return_value = {
+        "UnprocessedKeys": {"test-table": {"Keys": [{"table_name": {"S": "ORDERS_CDC"}}]}}
+    }
 
-        manager = WatermarkManager("test-table", mock_client)
-        prev_wm = datetime(2024, 1, 15, 10, 0, 0, tzinfo=timezone.utc)
-        new_wm = datetime(2024, 1, 15, 12, 0, 0, tzinfo=timezone.utc)
+    manager = WatermarkManager("test-table", mock_client)
 
+    with pytest.raises(WatermarkError):
+        manager.get_watermarks(["ORDERS_CDC"])
+
+    assert mock_client.batch_get_item.call_count == watermark_module.BATCH_GET_MAX_ATTEMPTS
+
+
+def test_update_watermark_first_run(mock_client):
+    """Test updating watermark on first run."""
+    manager = WatermarkManager("test-table", mock_client)
+
+    manager.update_watermark(
+        table_name="ORDERS_CDC",
+        new_watermark=NEW_WATERMARK,
+        rows_exported=500,
+        execution_id="abc123",
+        duration_seconds=30.5,
+        previous_watermark=None,
+    )
+
+    mock_client.update_item.assert_called_once()
+    call_args = mock_client.update_item.call_args
+    assert call_args.kwargs["Key"] == {"table_name": {"S": "ORDERS_CDC"}}
+    assert call_args.kwargs["ConditionExpression"] == "attribute_not_exists(table_name)"
+    assert "ADD version :one" in call_args.kwargs["UpdateExpression"]
+    assert call_args.kwargs["ExpressionAttributeValues"][":dur"] == {"N": "30.500"}
+
+
+def test_update_watermark_subsequent_run(mock_client):
+    """Test updating watermark with optimistic locking."""
+    manager = WatermarkManager("test-table", mock_client)
+
+    manager.update_watermark(
+        table_name="ORDERS_CDC",
+        new_watermark=NEW_WATERMARK,
+        rows_exported=500,
+        execution_id="abc123",
+        duration_seconds=30.5,
+        previous_watermark=OLD_WATERMARK,
+    )
+
+    call_args = mock_client.update_item.call_args
+    assert call_args.kwargs["ConditionExpression"] == "watermark = :prev"
+    assert call_args.kwargs["ExpressionAttributeValues"][":prev"] == OLD_WATERMARK_ATTR
+
+
+def test_update_watermark_uses_update_item(mock_client):
+    """Test that only the changed attributes are sent with UpdateItem."""
+    manager = WatermarkManager("test-table", mock_client)
+
+    manager.update_watermark(
+        table_name="ORDERS_CDC",
+        new_watermark=NEW_WATERMARK,
+        rows_exported=500,
+        execution_id="abc123",
+        duration_seconds=30.5,
+        previous_watermark=OLD_WATERMARK,
+    )
+
+    call_args = mock_client.update_item.call_args
+    assert call_args.kwargs["UpdateExpression"].startswith("SET watermark = :wm")
+    assert set(call_args.kwargs["ExpressionAttributeValues"]) == {
+        ":wm",
+        ":rows",
+        ":exec",
+        ":dur",
+        ":ts",
+        ":one",
+        ":prev",
+    }
+    assert "Item" not in call_args.kwargs
+
+
+def test_update_watermark_concurrent_modification(mock_client):
+    """Test handling concurrent modification."""
+    mock_client.update_item.side_effect = ClientError(
+        {"Error": {"Code": "ConditionalCheckFailedException", "Message": ""}},
+        "UpdateItem",
+    )
+
+    manager = WatermarkManager("test-table", mock_client)
+
+    with pytest.raises(ConcurrentModificationError) as exc_info:
         manager.update_watermark(
             table_name="ORDERS_CDC",
-            new_watermark=new_wm,
+            new_watermark=NEW_WATERMARK,
             rows_exported=500,
             execution_id="abc123",
             duration_seconds=30.5,
-            previous_watermark=prev_wm,
+            previous_watermark=OLD_WATERMARK,
         )
 
-        call_args = mock_client.put_item.call_args
-        assert call_args.kwargs["ConditionExpression"] == "watermark = :prev"
+    assert "Concurrent modification" in str(exc_info.value)
+
+
+def test_get_state(mock_client):
+    """Test getting full state information."""
+    mock_client.get_item.return_value = {
+        "Item": {
+            "table_name": {"S": "ORDERS_CDC"},
+            "watermark": OLD_WATERMARK_ATTR,
+            "rows_exported": {"N": "1000"},
+            "execution_id": {"S": "abc123"},
+            "duration_seconds": {"N": "30.5"},
+            "updated_at_ms": {"N": "1705313100000"},
+            "version": {"N": "7"},
+        }
+    }
+
+    manager = WatermarkManager("test-table", mock_client)
+    state = manager.get_state("ORDERS_CDC")
+
+    assert state["table_name"] == "ORDERS_CDC"
+    assert state["rows_exported"] == 1000
+    assert state["execution_id"] == "abc123"
+    assert state["duration_seconds"] == 30.5
+    assert state["version"] == 7
+    assert state["updated_at"] == "2024-01-15T10:05:00+00:00"
 
-    def test_update_watermark_concurrent_modification(self):
-        """Test handling concurrent modification."""
-        mock_client = MagicMock()
-        mock_client.put_item.side_effect = ClientError(
-            {"Error": {"Code": "ConditionalCheckFailedException", "Message": ""}},
-            "PutItem",
-        )
 
-        manager = WatermarkManager("test-table", mock_client)
-        prev_wm = datetime(2024, 1, 15, 10, 0, 0, tzinfo=timezone.utc)
-        new_wm = datetime(2024, 1, 15, 12, 0, 0, tzinfo=timezone.utc)
-
-        with pytest.raises(WatermarkError) as exc_info:
-            manager.update_watermark(
-                table_name="ORDERS_CDC",
-                new_watermark=new_wm,
-                rows_exported=500,
-                execution_id="abc123",
-                duration_seconds=30.5,
-                previous_watermark=prev_wm,
-            )
-
-        assert "Concurrent modification" in str(exc_info.value)
-
-    def test_get_state(self):
-        """Test getting full state information."""
-        mock_client = MagicMock()
-        mock_client.get_item.return_value = {
-            "Item": {
-                "table_name": {"S": "ORDERS_CDC"},
-                "watermark": {"S": "2024-01-15T10:00:00+00:00"},
-                "rows_exported": {"N": "1000"},
-                "execution_id": {"S": "abc123"},
-                "duration_seconds": {"N": "30.5"},
-                "updated_at": {"S": "2024-01-15T10:05:00+00:00"},
-            }
+def test_get_state_legacy_updated_at(mock_client):
+    """Test that items written before updated_at_ms keep their ISO string."""
+    mock_client.get_item.return_value = {
+        "Item": {
+            "table_name": {"S": "ORDERS_CDC"},
+            "watermark": OLD_WATERMARK_ATTR,
+            "updated_at": {"S": "2024-01-15T10:05:00+00:00"},
         }
+    }
 
-        manager = WatermarkManager("test-table", mock_client)
-        state = manager.get_state("ORDERS_CDC")
+    manager = WatermarkManager("test-table", mock_client)
+    state = manager.get_state("ORDERS_CDC")
 
-        assert state["table_name"] == "ORDERS_CDC"
-        assert state["rows_exported"] == 1000
-        assert state["execution_id"] == "abc123"
-        assert state["duration_seconds"] == 30.5
+    assert state["updated_at"] == "2024-01-15T10:05:00+00:00"
@@ -1,108 +1,403 @@
 """Tests for S3 Parquet writer."""
 
 from datetime import datetime, timezone
-from unittest.mock import MagicMock
 
 import pytest
 
 from src.exceptions import WriterError
 from src.writer import S3ParquetWriter
 
+_FIXED_TS = datetime(2024, 1, 15, 10, 30, 0, tzinfo=timezone.utc)
 
-class TestS3ParquetWriter:
-    """Tests for S3ParquetWriter."""
-
-    @pytest.fixture
-    def writer(self, s3_config, table_config, mock_s3):
-        """Create a writer with mock S3 client."""
-        return S3ParquetWriter(
-            s3_config=s3_config,
-            table_config=table_config,
-            execution_id="test123",
-            s3_client=mock_s3,
-        )
-
-    def test_generate_key(self, writer):
-        """Test S3 key generation."""
-        timestamp = datetime(2024, 1, 15, 10, 30, 0, tzinfo=timezone.utc)
-        key = writer._generate_key(timestamp)
-
-        assert key.startswith("cdc/public/orders/")
-        assert "LOAD20240115T103000_test123_" in key
-        assert key.endswith(".parquet")
-
-    def test_generate_key_increments(self, writer):
-        """Test that batch counter increments."""
-        timestamp = datetime(2024, 1, 15, 10, 30, 0, tzinfo=timezone.utc)
-
-        key1 = writer._generate_key(timestamp)
-        key2 = writer._generate_key(timestamp)
-
-        assert "_0001.parquet" in key1
-        assert "_0002.parquet" in key2
-
-    def test_write_batch(self, writer, sample_rows, mock_s3):
-        """Test writing a batch to S3."""
-        timestamp = datetime(2024, 1, 15, 10, 30, 0, tzinfo=timezone.utc)
-        key = writer.write_batch(sample_rows, timestamp)
-
-        assert key.startswith("cdc/public/orders/")
-        mock_s3.put_object.assert_called_once()
-
-        call_args = mock_s3.put_object.call_args
-        assert call_args.kwargs["Bucket"] == "test-bucket"
-        assert call_args.kwargs["ContentType"] == "application/octet-stream"
-
-    def test_write_batch_with_kms(self, table_config, mock_s3):
-        """Test writing with KMS encryption."""
-        from src.config import S3Config
-
-        s3_config = S3Config(
-            bucket="test-bucket",
-            prefix="cdc",
-            kms_key_id="arn:aws:kms:us-east-1:123456789012:key/test-key",
-        )
-
-        writer = S3ParquetWriter(
-            s3_config=s3_config,
-            table_config=table_config,
-            execution_id="test123",
-            s3_client=mock_s3,
-        )
-
-        sample_rows = [
-            {"order_id": 1, "status": "pending", "commit_ts": datetime.now(timezone.utc), "op": "I"}
-        ]
-        writer.write_batch(sample_rows)
-
-        call_args = mock_s3.put_object.call_args
-        assert call_args.kwargs["ServerSideEncryption"] == "aws:kms"
-        assert "test-key" in call_args.kwargs["SSEKMSKeyId"]
-
-    def test_write_empty_batch(self, writer):
-        """Test that empty batches are skipped."""
-        result = writer.write_batch([])
-        assert result == ""
-
-    def test_get_written_files(self, writer, sample_rows):
-        """Test file count tracking."""
-        assert writer.get_written_files() == 0
-
-        writer.write_batch(sample_rows)
-        assert writer.get_written_files() == 1
-
-        writer.write_batch(sample_rows)
-        assert writer.get_written_files() == 2
-
-    def test_convert_to_arrow(self, writer, sample_rows):
-        """Test conversion to Arrow table."""
-        table = writer._convert_to_arrow(sample_rows)
-
-        assert table.num_rows == 2
-        assert "order_id" in table.column_names
-        assert "op" in table.column_names
-
-    def test_convert_empty_raises(self, writer):
-        """Test that empty data raises error."""
-        with pytest.raises(WriterError):
-            writer._convert_to_arrow([])
+
+@pytest.fixture
+def writer(s3_config, table_config, mock_s3):
+    """Create a writer with mock S3 client."""
+    return S3ParquetWriter(
+        s3_config=s3_config,
+        table_config=table_config,
+        execution_id="test123",
+        s3_client=mock_s3,
+    )
+
+
+def test_generate_key(writer):
+    """Test S3 key generation."""
+    key = writer._generate_key(_FIXED_TS)
+
+    assert key.startswith("cdc/public/orders/")
+    assert "LOAD20240115T103000_test123_" in key
+    assert key.endswith(".parquet")
+
+
+def test_generate_key_uses_cached_prefix(writer):
+    """Test that keys are built from the prefix computed at init."""
+    assert writer._key_prefix == "cdc/public/orders/"
+
+    writer._key_prefix = "X/"
+
+    assert writer._generate_key(_FIXED_TS).startswith("X/LOAD20240115T103000_")
+
+
+def test_new_file_increments_suffix(writer, sample_rows):
+    """Test that each completed file gets the next key suffix."""
+    writer.file_target_bytes = 1
+
+    key1 = writer.write_batch(sample_rows)
+    key2 = writer.write_batch(sample_rows)
+
+    assert key1.endswith("_0001.parquet")
+    assert key2.endswith("_0002.parquet")
+
+
+def test_write_batch(writer, sample_rows, mock_s3):
+    """Test writing a batch to S3."""
+    assert writer.write_batch(sample_rows, _FIXED_TS) == ""
+    key = writer.flush()
+
+    assert key.startswith("cdc/public/orders/")
+    mock_s3.put_object.assert_called_once()
+
+    call_args = mock_s3.put_object.call_args
+    assert call_args.kwargs["Bucket"] == "test-bucket"
+    assert call_args.kwargs["ContentType"] == "application/octet-stream"
+
+
+def test_write_batch_multipart(writer, mock_s3):
+    """Test that files larger than one part stream as a multipart upload."""
+    import io
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    mock_s3.create_multipart_upload.return_value = {"UploadId": "upload-1"}
+    mock_s3.upload_part.side_effect = lambda **kw: {"ETag": f"etag-{kw['PartNumber']}"}
+    writer.part_size = 1024
+
+    batch = pa.RecordBatch.from_pydict(
+        {"order_id": list(range(5000)), "status": [f"status-{i}" for i in range(5000)]}
+    )
+    writer.write_batch(batch)
+    writer.flush()
+
+    mock_s3.put_object.assert_not_called()
+    part_calls = sorted(mock_s3.upload_part.call_args_list, key=lambda c: c.kwargs["PartNumber"])
+    assert len(part_calls) > 1
+
+    completed = mock_s3.complete_multipart_upload.call_args.kwargs
+    assert completed["UploadId"] == "upload-1"
+    assert [p["PartNumber"] for p in completed["MultipartUpload"]["Parts"]] == list(
+        range(1, len(part_calls) + 1)
+    )
+
+    body = b"".join(c.kwargs["Body"] for c in part_calls)
+    assert pq.read_table(io.BytesIO(body)).num_rows == 5000
+
+
+def test_write_batch_aborts_failed_multipart(writer, mock_s3):
+    """Test that a failed part upload aborts the multipart upload."""
+    import pyarrow as pa
+
+    mock_s3.create_multipart_upload.return_value = {"UploadId": "upload-1"}
+    mock_s3.upload_part.side_effect = RuntimeError("network down")
+    writer.part_size = 1024
+
+    batch = pa.RecordBatch.from_pydict({"order_id": list(range(5000))})
+    with pytest.raises(WriterError):
+        writer.write_batch(batch)
+        writer.flush()
+
+    mock_s3.abort_multipart_upload.assert_called_once()
+    mock_s3.complete_multipart_upload.assert_not_called()
+
+
+def test_write_batch_compression(writer, sample_rows, mock_s3):
+    """Test that files are written with the configured codec."""
+    import io
+
+    import pyarrow.parquet as pq
+
+    writer.write_batch(sample_rows)
+    writer.flush()
+
+    body = mock_s3.put_object.call_args.kwargs["Body"]
+    metadata = pq.ParquetFile(io.BytesIO(body)).metadata
+    assert metadata.row_group(0).column(0).compression == "ZSTD"
+
+
+def test_write_batch_omits_arrow_schema(writer, sample_rows, mock_s3):
+    """Test that files carry no embedded Arrow schema and use microsecond timestamps."""
+    import io
+
+    import pyarrow.parquet as pq
+
+    writer.write_batch(sample_rows)
+    writer.flush()
+
+    parquet_file = pq.ParquetFile(io.BytesIO(mock_s3.put_object.call_args.kwargs["Body"]))
+    assert b"ARROW:schema" not in (parquet_file.metadata.metadata or {})
+    assert str(parquet_file.schema_arrow.field("commit_ts").type) == "timestamp[us, tz=UTC]"
+
+
+def test_write_batch_uses_execution_timestamp(writer, sample_rows):
+    """Test that files from one execution share a load timestamp."""
+    writer.write_batch(sample_rows)
+    key1 = writer.flush()
+    writer.write_batch(sample_rows)
+    key2 = writer.flush()
+
+    assert key1 != key2
+    assert key1.rsplit("_", 1)[0] == key2.rsplit("_", 1)[0]
+
+
+def test_write_batch_with_kms(table_config, mock_s3):
+    """Test writing with KMS encryption."""
+    from src.config import S3Config
+
+    s3_config = S3Config(
+        bucket="test-bucket",
+        prefix="cdc",
+        kms_key_id="arn:aws:kms:us-east-1:123456789012:key/test-key",
+    )
+
+    writer = S3ParquetWriter(
+        s3_config=s3_config,
+        table_config=table_config,
+        execution_id="test123",
+        s3_client=mock_s3,
+    )
+
+    sample_rows = [{"order_id": 1, "status": "pending", "commit_ts": _FIXED_TS, "op": "I"}]
+    writer.write_batch(sample_rows)
+    writer.flush()
+
+    call_args = mock_s3.put_object.call_args
+    assert call_args.kwargs["ServerSideEncryption"] == "aws:kms"
+    assert "test-key" in call_args.kwargs["SSEKMSKeyId"]
+
+
+def test_write_batch_streams_row_groups(writer, sample_rows, mock_s3):
+    """Test that batches are appended as row groups of one file."""
+    import io
+
+    import pyarrow.parquet as pq
+
+    assert writer.write_batch(sample_rows) == ""
+    assert writer.write_batch(sample_rows) == ""
+    mock_s3.put_object.assert_not_called()
+
+    key = writer.flush()
+
+    assert key.endswith("_0001.parquet")
+    mock_s3.put_object.assert_called_once()
+    metadata = pq.ParquetFile(io.BytesIO(mock_s3.put_object.call_args.kwargs["Body"])).metadata
+    assert metadata.num_rows == 4
+    assert metadata.num_row_groups == 2
+    assert writer.flush() == ""
+
+
+def test_write_batch_size_follows_configured_batch_size(writer, sample_rows, monkeypatch):
+    """Test that the encoding batch size comes from config, not the first batch."""
+    import pyarrow.parquet as pq
+
+    opened = []
+    parquet_writer = pq.ParquetWriter
+
+    def recording_writer(*args, **kwargs):
+        opened.append(kwargs)
+        return parquet_writer(*args, **kwargs)
+
+    monkeypatch.setattr(pq, "ParquetWriter", recording_writer)
+
+    writer.write_batch(sample_rows[:1])
+
+    assert opened[0]["write_batch_size"] == writer.table_config.batch_size
+
+
+def test_write_batch_schema_change_starts_new_file(writer, mock_s3):
+    """Test that a batch whose schema cannot be cast goes to a new file."""
+    import pyarrow as pa
+
+    writer.write_batch(pa.RecordBatch.from_pydict({"order_id": [1], "note": [None]}))
+    key1 = writer.write_batch(pa.RecordBatch.from_pydict({"order_id": [2], "note": ["x"]}))
+    key2 = writer.flush()
+
+    assert key1.endswith("_0001.parquet")
+    assert key2.endswith("_0002.parquet")
+    assert mock_s3.put_object.call_count == 2
+
+
+def test_write_batch_new_struct_field_starts_new_file(writer, mock_s3):
+    """Test that a struct field first seen in a later batch is not cast away."""
+    import io
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer.write_batch(pa.RecordBatch.from_pydict({"order_id": [1], "payload": [{"b": "x"}]}))
+    writer.write_batch(
+        pa.RecordBatch.from_pydict({"order_id": [2], "payload": [{"a": 2, "b": "y"}]})
+    )
+    writer.flush()
+
+    assert mock_s3.put_object.call_count == 2
+    body = mock_s3.put_object.call_args_list[1].kwargs["Body"]
+    assert pq.read_table(io.BytesIO(body)).column("payload").to_pylist() == [{"a": 2, "b": "y"}]
+
+
+def test_write_batch_narrower_decimals_append_to_open_file(writer, mock_s3):
+    """Test that decimals fitting the open file's precision and scale share its file."""
+    import io
+    from decimal import Decimal
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    for amount in (Decimal("100.25"), Decimal("1.5"), Decimal("3.10")):
+        writer.write_batch(pa.RecordBatch.from_pydict({"order_id": [1], "amount": [amount]}))
+    writer.flush()
+
+    mock_s3.put_object.assert_called_once()
+    body = mock_s3.put_object.call_args.kwargs["Body"]
+    assert pq.read_table(io.BytesIO(body)).column("amount").to_pylist() == [
+        Decimal("100.25"),
+        Decimal("1.50"),
+        Decimal("3.10"),
+    ]
+
+
+def test_write_batch_null_column_appends_to_open_file(writer, mock_s3):
+    """Test that an all-NULL column takes the open file's type."""
+    import io
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer.write_batch(pa.RecordBatch.from_pydict({"order_id": [1], "note": ["x"]}))
+    writer.write_batch(pa.RecordBatch.from_pydict({"order_id": [2], "note": [None]}))
+    writer.flush()
+
+    mock_s3.put_object.assert_called_once()
+    body = mock_s3.put_object.call_args.kwargs["Body"]
+    assert pq.read_table(io.BytesIO(body)).column("note").to_pylist() == ["x", None]
+
+
+def test_abort_discards_open_file(writer, sample_rows, mock_s3):
+    """Test that abort drops the open file without uploading it."""
+    writer.write_batch(sample_rows)
+    writer.abort()
+
+    assert writer.flush() == ""
+    mock_s3.put_object.assert_not_called()
+
+
+def test_write_empty_batch(writer):
+    """Test that empty batches are skipped."""
+    result = writer.write_batch([])
+    assert result == ""
+
+
+def test_get_written_files(writer, sample_rows):
+    """Test file count tracking."""
+    assert writer.get_written_files() == 0
+
+    writer.write_batch(sample_rows)
+    writer.write_batch(sample_rows)
+    assert writer.get_written_files() == 1
+
+    writer.flush()
+    writer.write_batch(sample_rows)
+    assert writer.get_written_files() == 2
+
+
+def test_convert_to_arrow(writer, sample_rows, sample_columns):
+    """Test that row dicts and columnar batches convert to the same table."""
+    import pyarrow as pa
+
+    from_rows = writer._convert_to_arrow(sample_rows)
+    from_columns = writer._convert_to_arrow(pa.RecordBatch.from_pydict(sample_columns))
+
+    assert from_rows.num_rows == 2
+    assert from_rows.equals(from_columns)
+
+
+def test_convert_parses_timestamp_strings(writer):
+    """Test that ISO timestamp strings become UTC timestamps."""
+    import pyarrow as pa
+
+    rows = [
+        {"order_id": 1, "commit_ts": "2024-01-15T10:00:00Z", "op": "I"},
+        {"order_id": 2, "commit_ts": "2024-01-15T11:00:00+00:00", "op": "U"},
+    ]
+    table = writer._convert_to_arrow(rows)
+
+    assert table.schema.field("commit_ts").type == pa.timestamp("us", tz="UTC")
+    assert table.column("commit_ts")[0].as_py() == datetime(
+        2024, 1, 15, 10, 0, 0, tzinfo=timezone.utc
+    )
+
+
+def test_convert_dictionary_encodes_op(writer, sample_rows):
+    """Test that the op column is stored as a dictionary."""
+    import pyarrow as pa
+
+    table = writer._convert_to_arrow(sample_rows)
+
+    assert table.schema.field("op").type == pa.dictionary(pa.int8(), pa.string())
+    assert table.column("op").to_pylist() == ["I", "U"]
+
+
+def test_write_batch_widened_row_dict_type_keeps_values(writer, mock_s3):
+    """Test that a row-dict column changing from int to float is not truncated."""
+    import io
+
+    import pyarrow.parquet as pq
+
+    writer.write_batch([{"order_id": 1, "price": 1}])
+    writer.write_batch([{"order_id": 2, "price": 1.5}])
+    writer.flush()
+
+    bodies = [call.kwargs["Body"] for call in mock_s3.put_object.call_args_list]
+    prices = [pq.read_table(io.BytesIO(body)).column("price").to_pylist() for body in bodies]
+    assert prices == [[1], [1.5]]
+
+
+def test_write_batch_new_row_dict_key_keeps_values(writer, mock_s3):
+    """Test that a key first seen in a later row-dict batch is written."""
+    import io
+
+    import pyarrow.parquet as pq
+
+    writer.write_batch([{"order_id": 1}])
+    writer.write_batch([{"order_id": 2, "note": "x"}])
+    writer.flush()
+
+    assert mock_s3.put_object.call_count == 2
+    body = mock_s3.put_object.call_args_list[1].kwargs["Body"]
+    assert pq.read_table(io.BytesIO(body)).to_pylist() == [{"order_id": 2, "note": "x"}]
+
+
+def test_write_batch_all_null_row_dict_column_appends(writer, sample_rows, mock_s3):
+    """Test that a row-dict column that is all NULL in one batch keeps the file's type."""
+    writer.write_batch(sample_rows)
+    writer.write_batch([dict(sample_rows[0], customer_id=None)])
+    writer.flush()
+
+    mock_s3.put_object.assert_called_once()
+
+
+def test_convert_record_batch(writer):
+    """Test that extractor record batches pass through without pandas."""
+    import pyarrow as pa
+
+    batch = pa.RecordBatch.from_pydict({"order_id": [1, 2], "op": ["I", "U"]})
+    table = writer._convert_to_arrow(batch)
+
+    assert table.num_rows == 2
+    assert table.column_names == ["order_id", "op"]
+
+
+def test_convert_empty_raises(writer):
+    """Test that empty data raises error."""
+    with pytest.raises(WriterError):
+        writer._convert_to_arrow([])
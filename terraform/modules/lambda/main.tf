@@ -85,6 +85,7 @@ resource "aws_iam_role_policy" "lambda_s3" {
         Effect = "Allow"
         Action = [
           "s3:PutObject",
+          "s3:AbortMultipartUpload",
           "s3:GetObject",
           "s3:ListBucket"
         ]
@@ -111,6 +112,7 @@ resource "aws_iam_role_policy" "lambda_kms" {
         Effect = "Allow"
         Action = [
           "kms:Encrypt",
+          "kms:Decrypt",
           "kms:GenerateDataKey"
         ]
         Resource = var.kms_key_arn
@@ -131,7 +133,6 @@ resource "aws_iam_role_policy" "lambda_dynamodb" {
         Effect = "Allow"
         Action = [
           "dynamodb:GetItem",
-          "dynamodb:PutItem",
           "dynamodb:UpdateItem"
         ]
         Resource = var.dynamodb_table_arn
@@ -207,7 +208,7 @@ resource "aws_sqs_queue" "dlq" {
 
 resource "aws_lambda_layer_version" "dependencies" {
   layer_name          = "${var.project_name}-cdc-dependencies"
-  description         = "Python dependencies for CDC Lambda (pandas, pyarrow, psycopg2)"
+  description         = "Python dependencies for CDC Lambda (pyarrow, psycopg2)"
   compatible_runtimes = ["python3.11"]
 
   # Use S3 or local file - adjust as needed
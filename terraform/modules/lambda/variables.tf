@@ -76,7 +76,7 @@ variable "table_definitions" {
     schedule_expression = optional(string, "rate(5 minutes)")
     batch_size          = optional(number, 10000)
     timeout_seconds     = optional(number, 300)
-    memory_mb           = optional(number, 512)
+    memory_mb           = optional(number, 1769) # 1769 MB = one full vCPU
   }))
 }
 
@@ -201,6 +201,11 @@ resource "aws_s3_bucket_lifecycle_configuration" "data_lake" {
     expiration {
       days = 30
     }
+
+    # Parquet files stream as multipart uploads; drop any a failed run left behind
+    abort_incomplete_multipart_upload {
+      days_after_initiation = 1
+    }
   }
 }
 
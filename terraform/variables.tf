@@ -168,7 +168,7 @@ variable "lambda_table_definitions" {
     schedule_expression = optional(string, "rate(5 minutes)")
     batch_size          = optional(number, 10000)
     timeout_seconds     = optional(number, 300)
-    memory_mb           = optional(number, 512)
+    memory_mb           = optional(number, 1769) # 1769 MB = one full vCPU
   }))
   default = {
     ORDERS_CDC = {
@@ -181,7 +181,7 @@ variable "lambda_table_definitions" {
       schedule_expression = "rate(5 minutes)"
       batch_size          = 10000
       timeout_seconds     = 300
-      memory_mb           = 512
+      memory_mb           = 1769
     }
     CUSTOMERS_CDC = {
       source_schema       = "public"
@@ -193,7 +193,7 @@ variable "lambda_table_definitions" {
       schedule_expression = "rate(5 minutes)"
       batch_size          = 10000
       timeout_seconds     = 300
-      memory_mb           = 512
+      memory_mb           = 1769
     }
   }
 }